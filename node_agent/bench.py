@@ -0,0 +1,681 @@
+#!/usr/bin/env python3
+"""Benchmark harness for the node agent.
+
+Builds a synthetic /sys/fs/cgroup-shaped tree (cgroup v1 or v2 layout) with
+thousands of containers, runs a fake Wings API, fake Minecraft status servers
+(some slow, some hung) and a stand-in orchestrator on localhost, and reports
+the cost of cgroup resolution, server sampling, discovery, player probes,
+publishing and a full scheduler run against them.
+
+Only /proc/stat and /proc/loadavg are read from the host. Agent options are
+taken from the environment as usual (AGENT_DELTA_ENCODING,
+AGENT_UPLOAD_BATCH_SIZE, ...); endpoints and the cgroup root always point at
+the fakes.
+
+    python3 bench.py --servers 2000 --layout v1 --duration 20
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import heapq
+import json
+import os
+import selectors
+import shutil
+import socket
+import sys
+import tempfile
+import threading
+import time
+from dataclasses import replace
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Optional
+
+import main
+
+
+def bench_container_id(index: int) -> str:
+    return hashlib.sha256(f"bench-container-{index}".encode("ascii")).hexdigest()
+
+
+def bench_server_id(index: int) -> str:
+    return f"{index:08x}-0000-4000-8000-{index:012x}"
+
+
+class SyntheticCgroupTree:
+    # Plain files laid out like a Docker host's cgroup mount. v2 keeps every
+    # container under system.slice/docker-<id>.scope; v1 splits each one over
+    # the cpu,cpuacct, blkio and memory hierarchies under docker/<id>.
+    # Unrelated units are added so index rebuilds walk a realistic tree.
+    NOISE_UNITS = 200
+    V1_CPU = "cpu,cpuacct"
+
+    def __init__(self, root: str, layout: str, container_ids: list[str]) -> None:
+        self.root = root
+        self.layout = layout
+        self.container_ids = container_ids
+        count = len(container_ids)
+        # Container i uses about (i % 8) / 4 cores and writes (i % 16) * 64 KiB/s.
+        self.cpu_usage_usec = [0] * count
+        self.write_bytes = [0] * count
+        self.throttled = [0] * count
+
+    def build(self) -> None:
+        if self.layout == "v2":
+            self._write(self.root, "cgroup.controllers", "cpuset cpu io memory hugetlb pids rdma misc\n")
+        for index in range(self.NOISE_UNITS):
+            unit = f"bench-noise-{index}.service"
+            if self.layout == "v2":
+                self._write(os.path.join(self.root, "system.slice", unit), "cpu.stat", "usage_usec 0\n")
+            else:
+                self._write(os.path.join(self.root, self.V1_CPU, "system.slice", unit), "cpuacct.usage", "0\n")
+        for container_id in self.container_ids:
+            for directory, name, text in self._static_files(container_id):
+                self._write(directory, name, text)
+        self.advance(0.0)
+
+    def advance(self, elapsed_sec: float) -> None:
+        # Moves every container's counters forward as if elapsed_sec passed.
+        for index, container_id in enumerate(self.container_ids):
+            self.cpu_usage_usec[index] += int(elapsed_sec * 1_000_000 * (index % 8) / 4)
+            self.write_bytes[index] += int(elapsed_sec * (index % 16) * 65536)
+            if index % 8 == 7:
+                self.throttled[index] += int(elapsed_sec * 10)
+            for directory, name, text in self._counter_files(index, container_id):
+                self._write(directory, name, text)
+
+    def cpu_path(self, container_id: str) -> str:
+        if self.layout == "v2":
+            return os.path.join(self.root, "system.slice", f"docker-{container_id}.scope")
+        return os.path.join(self.root, self.V1_CPU, "docker", container_id)
+
+    def _v1_path(self, controller: str, container_id: str) -> str:
+        return os.path.join(self.root, controller, "docker", container_id)
+
+    def _static_files(self, container_id: str) -> list[tuple[str, str, str]]:
+        if self.layout == "v2":
+            path = self.cpu_path(container_id)
+            pressure = "some avg10=0.00 avg60=0.00 avg300=0.00 total=0\nfull avg10=0.00 avg60=0.00 avg300=0.00 total=0\n"
+            return [
+                (path, "cpu.max", "200000 100000\n"),
+                (path, "memory.stat", "anon 268435456\nfile 134217728\npgmajfault 12\n"),
+                (path, "cpu.pressure", pressure),
+                (path, "io.pressure", pressure),
+                (path, "memory.pressure", pressure),
+            ]
+        memory = self._v1_path("memory", container_id)
+        return [
+            (self.cpu_path(container_id), "cpu.cfs_quota_us", "200000\n"),
+            (self.cpu_path(container_id), "cpu.cfs_period_us", "100000\n"),
+            (memory, "memory.stat", "rss 268435456\ncache 134217728\npgmajfault 12\n"),
+        ]
+
+    def _counter_files(self, index: int, container_id: str) -> list[tuple[str, str, str]]:
+        usage = self.cpu_usage_usec[index]
+        written = self.write_bytes[index]
+        periods = usage // 50_000
+        memory_bytes = 402653184 + (index % 64) * 1048576
+        if self.layout == "v2":
+            path = self.cpu_path(container_id)
+            return [
+                (
+                    path,
+                    "cpu.stat",
+                    f"usage_usec {usage}\nuser_usec {usage * 3 // 4}\nsystem_usec {usage // 4}\n"
+                    f"nr_periods {periods}\nnr_throttled {self.throttled[index]}\n"
+                    f"throttled_usec {self.throttled[index] * 1000}\n",
+                ),
+                (path, "io.stat", f"259:0 rbytes=4096 wbytes={written} rios=1 wios={written // 4096} dbytes=0 dios=0\n"),
+                (path, "memory.current", f"{memory_bytes}\n"),
+            ]
+        cpu = self.cpu_path(container_id)
+        return [
+            (cpu, "cpuacct.usage", f"{usage * 1000}\n"),
+            (
+                cpu,
+                "cpu.stat",
+                f"nr_periods {periods}\nnr_throttled {self.throttled[index]}\n"
+                f"throttled_time {self.throttled[index] * 1_000_000}\n",
+            ),
+            (
+                self._v1_path("blkio", container_id),
+                "blkio.throttle.io_service_bytes",
+                f"8:0 Read 4096\n8:0 Write {written}\n8:0 Sync 0\n8:0 Async {written}\n8:0 Total {written + 4096}\n"
+                f"Total {written + 4096}\n",
+            ),
+            (self._v1_path("memory", container_id), "memory.usage_in_bytes", f"{memory_bytes}\n"),
+        ]
+
+    def _write(self, directory: str, name: str, text: str) -> None:
+        # Rewritten in place, new contents before the truncate: the agent
+        # keeps these files open and may read them concurrently.
+        os.makedirs(directory, exist_ok=True)
+        data = text.encode("ascii")
+        fd = os.open(os.path.join(directory, name), os.O_WRONLY | os.O_CREAT, 0o644)
+        try:
+            os.pwrite(fd, data, 0)
+            os.ftruncate(fd, len(data))
+        finally:
+            os.close(fd)
+
+
+class BenchRequestHandler(BaseHTTPRequestHandler):
+    # Serves the Wings server list (with ETag revalidation) on GET and accepts
+    # any telemetry POST.
+    protocol_version = "HTTP/1.1"
+    server: "BenchHttpServer"
+
+    def do_GET(self) -> None:  # noqa: N802
+        self.server.count(0)
+        if self.path != "/api/servers":
+            self._respond(404, b"{}")
+            return
+        if self.headers.get("If-None-Match") == self.server.etag:
+            self._respond(304, b"")
+            return
+        self._respond(200, self.server.wings_body, {"ETag": self.server.etag})
+
+    def do_POST(self) -> None:  # noqa: N802
+        body = self.rfile.read(int(self.headers.get("Content-Length", "0")))
+        self.server.count(len(body))
+        self._respond(202, b"{}")
+
+    def _respond(self, status: int, body: bytes, headers: Optional[dict[str, str]] = None) -> None:
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args: Any) -> None:  # noqa: A002
+        return
+
+
+class BenchHttpServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, wings_servers: Optional[list[dict[str, Any]]] = None) -> None:
+        super().__init__(("127.0.0.1", 0), BenchRequestHandler)
+        self.wings_body = json.dumps({"data": wings_servers or []}).encode("utf-8")
+        self.etag = '"' + hashlib.blake2b(self.wings_body, digest_size=8).hexdigest() + '"'
+        self.requests = 0
+        self.body_bytes = 0
+        self._lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def count(self, body_bytes: int) -> None:
+        with self._lock:
+            self.requests += 1
+            self.body_bytes += body_bytes
+
+    def start(self) -> None:
+        threading.Thread(target=self.serve_forever, name="bench-http", daemon=True).start()
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+
+
+class FakeStatusServers:
+    # Minecraft status responders on localhost ports, all served by one
+    # selector thread. "slow" ports answer after slow_delay_sec, "hung" ports
+    # accept and never answer; the rest answer right away. The response
+    # carries a favicon so the early players.online scan is exercised.
+    def __init__(self, count: int, slow: int, hung: int, slow_delay_sec: float) -> None:
+        self.slow_delay_sec = slow_delay_sec
+        self.listeners: list[socket.socket] = []
+        self.modes: dict[int, str] = {}
+        for index in range(count):
+            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            sock.bind(("127.0.0.1", 0))
+            sock.listen(128)
+            sock.setblocking(False)
+            port = sock.getsockname()[1]
+            self.listeners.append(sock)
+            self.modes[port] = "hung" if index < hung else "slow" if index < hung + slow else "ok"
+        self.answered = 0
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="bench-mc", daemon=True)
+
+    @property
+    def ports(self) -> list[int]:
+        return list(self.modes)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        self._thread.join(2.0)
+        for sock in self.listeners:
+            sock.close()
+
+    def _response(self, port: int) -> bytes:
+        status = {
+            "version": {"name": "1.20.4", "protocol": 765},
+            "players": {"max": 100, "online": port % 50, "sample": []},
+            "description": {"text": "bench"},
+            "favicon": "data:image/png;base64," + "A" * 8192,
+        }
+        packet = main.encode_varint(0x00) + main.encode_mc_string(json.dumps(status))
+        return main.encode_varint(len(packet)) + packet
+
+    def _answer(self, conn: socket.socket, port: int) -> None:
+        try:
+            conn.settimeout(1.0)
+            conn.sendall(self._response(port))
+            self.answered += 1
+        except OSError:
+            pass
+        finally:
+            conn.close()
+
+    def _run(self) -> None:
+        selector = selectors.DefaultSelector()
+        for sock in self.listeners:
+            selector.register(sock, selectors.EVENT_READ, sock.getsockname()[1])
+        delayed: list[tuple[float, int, socket.socket, int]] = []
+        held: list[socket.socket] = []
+
+        while not self._stop_event.is_set():
+            now = time.monotonic()
+            while delayed and delayed[0][0] <= now:
+                _, _, conn, port = heapq.heappop(delayed)
+                self._answer(conn, port)
+            timeout = min(delayed[0][0] - now, 0.1) if delayed else 0.1
+
+            for key, _ in selector.select(max(timeout, 0.0)):
+                sock = key.fileobj
+                port = key.data
+                if sock in self.listeners:
+                    try:
+                        conn, _ = sock.accept()
+                    except OSError:
+                        continue
+                    conn.setblocking(False)
+                    selector.register(conn, selectors.EVENT_READ, port)
+                    continue
+
+                # The client sends handshake and status request together;
+                # answer on the first read without parsing them.
+                selector.unregister(sock)
+                try:
+                    received = sock.recv(4096)
+                except OSError:
+                    received = b""
+                mode = self.modes[port]
+                if not received:
+                    sock.close()
+                elif mode == "ok":
+                    self._answer(sock, port)
+                elif mode == "slow":
+                    heapq.heappush(delayed, (time.monotonic() + self.slow_delay_sec, sock.fileno(), sock, port))
+                else:
+                    held.append(sock)
+
+        for _, _, conn, _ in delayed:
+            conn.close()
+        for conn in held:
+            conn.close()
+        selector.close()
+
+
+def bench_resolver(tree: SyntheticCgroupTree, miss_ttl_sec: float) -> dict[str, Any]:
+    resolver = main.CgroupResolver(tree.root, miss_ttl_sec=miss_ttl_sec)
+    container_ids = tree.container_ids
+
+    started = time.perf_counter()
+    resolver.resolve(container_ids[0])
+    cold_ms = (time.perf_counter() - started) * 1000.0
+    for container_id in container_ids[1:]:
+        resolver.resolve(container_id)
+    cold = resolver.resolve_latency.summary()
+
+    resolver.resolve_latency = main.LatencyHistogram()
+    for container_id in container_ids:
+        resolver.resolve(container_id)
+    warm = resolver.resolve_latency.summary()
+
+    resolver.resolve_latency = main.LatencyHistogram()
+    for index in range(len(container_ids), len(container_ids) + 100):
+        resolver.resolve(bench_container_id(index))
+    unknown = resolver.resolve_latency.summary()
+
+    resolved_ok = sum(
+        1 for container_id in container_ids if resolver.resolve(container_id) == tree.cpu_path(container_id)
+    )
+    return {
+        "containers": len(container_ids),
+        "resolved_ok": resolved_ok,
+        "first_resolve_ms": round(cold_ms, 3),
+        "index_rebuilds": resolver.index_rebuilds,
+        "cold": cold,
+        "warm": warm,
+        "unknown": unknown,
+    }
+
+
+def bench_sampling(
+    tree: SyntheticCgroupTree,
+    servers: list[main.DiscoveredServer],
+    rounds: int,
+    interval_sec: float,
+    contention_metrics: bool,
+) -> tuple[dict[str, Any], dict[str, Any]]:
+    # Simulated time: the tree is advanced by interval_sec between rounds
+    # (not timed) and the same step is passed as the monotonic clock, so the
+    # derived rates are exact.
+    resolver = main.CgroupResolver(tree.root)
+    reader = main.PseudoFileReader()
+    store = main.ServerCounterStore()
+    node_tracker = main.NodeMetricTracker(reader)
+    batch = [(server, main.ServerRuntimeState(slot=store.allocate())) for server in servers]
+
+    full_rounds = main.LatencyHistogram()
+    fast_rounds = main.LatencyHistogram()
+    node_samples = main.LatencyHistogram()
+    clock = time.monotonic()
+    metrics: list[main.ServerMetrics] = []
+    node_metrics = node_tracker.sample()
+    reads_before = reader.reads
+    bytes_before = reader.read_bytes
+
+    for _ in range(max(rounds, 2)):
+        tree.advance(interval_sec)
+        clock += interval_sec
+        started = time.perf_counter()
+        metrics = main.sample_servers(batch, store, resolver, reader, clock, contention_metrics)
+        full_rounds.observe(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        node_metrics = node_tracker.sample()
+        node_samples.observe(time.perf_counter() - started)
+    full_reads = reader.reads - reads_before
+    full_bytes = reader.read_bytes - bytes_before
+
+    for _ in range(max(rounds, 2)):
+        tree.advance(interval_sec / 4)
+        clock += interval_sec / 4
+        started = time.perf_counter()
+        main.sample_servers_cpu_io(batch, store, resolver, reader, clock)
+        fast_rounds.observe(time.perf_counter() - started)
+
+    sampled_ok = sum(1 for server_metrics in metrics if server_metrics is not main.EMPTY_SERVER_METRICS)
+    expected_cpu = [(index % 8) / 4 * 100.0 for index in range(len(servers))]
+    cpu_errors = sum(
+        1
+        for server_metrics, expected in zip(metrics, expected_cpu)
+        if abs(server_metrics.cpu_pct - expected) > 0.5
+    )
+    payload = {
+        "node_id": "bench",
+        "timestamp": main.datetime.now(main.timezone.utc).isoformat(),
+        "node": main.node_payload(node_metrics),
+        "servers": [
+            main.server_payload(server, state, server_metrics)
+            for (server, state), server_metrics in zip(batch, metrics)
+        ],
+    }
+    reader.close_all()
+    full = full_rounds.summary()
+    results = {
+        "servers": len(servers),
+        "sampled_ok": sampled_ok,
+        "cpu_rate_errors": cpu_errors,
+        "round": full,
+        "per_server_us": round(full["mean_ms"] * 1000.0 / max(len(servers), 1), 3),
+        "reads_per_round": full_reads // max(rounds, 2),
+        "read_bytes_per_round": full_bytes // max(rounds, 2),
+        "fast_round": fast_rounds.summary(),
+        "node_sample": node_samples.summary(),
+        "file_opens": reader.opens,
+        "max_open_fds": reader.max_open,
+        "numpy": main.numpy is not None,
+    }
+    return results, payload
+
+
+def bench_discovery(config: main.AgentConfig, rounds: int) -> dict[str, Any]:
+    http_client = main.HttpClient(timeout_sec=config.http_timeout_sec, insecure_tls=False)
+    discoverer = main.WingsDiscoverer(config, http_client)
+
+    started = time.perf_counter()
+    servers = discoverer.discover_servers()
+    first_ms = (time.perf_counter() - started) * 1000.0
+
+    revalidated = main.LatencyHistogram()
+    for _ in range(rounds):
+        started = time.perf_counter()
+        discoverer.discover_servers()
+        revalidated.observe(time.perf_counter() - started)
+    http_client.close()
+    return {"servers": len(servers), "first_ms": round(first_ms, 3), "revalidated": revalidated.summary()}
+
+
+def bench_probes(config: main.AgentConfig, status_servers: FakeStatusServers) -> dict[str, Any]:
+    # One probe per fake status server, all submitted at once; hung and slow
+    # servers must not hold up the healthy ones.
+    engine = main.PlayerProbeEngine(config)
+    states = {str(port): main.ServerRuntimeState() for port in status_servers.ports}
+    healthy = {str(port) for port, mode in status_servers.modes.items() if mode == "ok"}
+    answered_before = status_servers.answered
+
+    started = time.monotonic()
+    for port in status_servers.ports:
+        engine.submit(str(port), config.node_ip, port, started)
+
+    healthy_ms: Optional[float] = None
+    limit = started + max(config.minecraft_ping_deadline_sec, config.minecraft_ping_timeout_sec) + 1.0
+    while time.monotonic() < limit:
+        time.sleep(0.02)
+        engine.harvest(states, time.monotonic())
+        if healthy_ms is None and all(states[server_id].players_online is not None for server_id in healthy):
+            healthy_ms = (time.monotonic() - started) * 1000.0
+        if all(state.players_online is not None for state in states.values()):
+            break
+    total_ms = (time.monotonic() - started) * 1000.0
+    engine.close()
+
+    return {
+        "servers": len(states),
+        "healthy": len(healthy),
+        "answered": status_servers.answered - answered_before,
+        "with_players": sum(1 for state in states.values() if state.players_online is not None),
+        "healthy_complete_ms": None if healthy_ms is None else round(healthy_ms, 3),
+        "total_ms": round(total_ms, 3),
+        "probe": {name: histogram.summary() for name, histogram in engine.probe_latency.items()},
+    }
+
+
+def bench_publish(config: main.AgentConfig, payload: dict[str, Any], rounds: int, orchestrator: BenchHttpServer) -> dict[str, Any]:
+    http_client = main.HttpClient(timeout_sec=config.http_timeout_sec, insecure_tls=False)
+    publisher = main.OrchestratorPublisher(config, http_client)
+    requests_before = orchestrator.requests
+    failed = 0
+
+    started = time.perf_counter()
+    if publisher.batching:
+        for _ in range(max(rounds // config.upload_batch_size, 1)):
+            failed += not publisher.publish_batch([payload] * config.upload_batch_size).sent
+        samples = max(rounds // config.upload_batch_size, 1) * config.upload_batch_size
+    else:
+        for _ in range(rounds):
+            failed += not publisher.publish(payload).sent
+        samples = rounds
+    elapsed = time.perf_counter() - started
+    http_client.close()
+
+    return {
+        "samples": samples,
+        "requests": orchestrator.requests - requests_before,
+        "failed": failed,
+        "samples_per_s": round(samples / elapsed, 1),
+        "payload_bytes_per_sample": publisher.payload_bytes // samples,
+        "wire_bytes_per_s": round(publisher.wire_bytes / elapsed, 1),
+        "encode": publisher.encode_latency.summary(),
+        "post": publisher.post_latency.summary(),
+    }
+
+
+def bench_agent(config: main.AgentConfig, tree: SyntheticCgroupTree, duration_sec: float, orchestrator: BenchHttpServer) -> dict[str, Any]:
+    # The real scheduler against the fakes, with the tree advancing once a
+    # second in the background like a live host.
+    agent = main.NodeAgent(config)
+    requests_before = orchestrator.requests
+    stop_event = threading.Event()
+
+    def advance() -> None:
+        while not stop_event.wait(1.0):
+            tree.advance(1.0)
+
+    advancer = threading.Thread(target=advance, name="bench-advance", daemon=True)
+    advancer.start()
+    agent.start()
+    time.sleep(duration_sec)
+    agent.scheduler.stop(timeout_sec=config.http_timeout_sec + 5.0)
+    stop_event.set()
+    advancer.join()
+    agent.close()
+
+    metrics = agent.agent_metrics(main.ProcessUsage(), time.monotonic())
+    return {
+        "duration_sec": duration_sec,
+        "posts": orchestrator.requests - requests_before,
+        "jobs": {
+            job.name: {
+                "runs": job.stats.runs,
+                "overruns": job.stats.overruns,
+                "errors": job.stats.errors,
+                "max_lag_ms": round(job.stats.max_lag_sec * 1000.0, 3),
+                "max_duration_ms": round(job.stats.max_duration_sec * 1000.0, 3),
+            }
+            for job in agent.scheduler.jobs
+        },
+        "latency": metrics["latency"],
+        "rss_bytes": metrics["rss_bytes"],
+    }
+
+
+def print_report(results: dict[str, dict[str, Any]]) -> None:
+    for section, values in results.items():
+        print(section)
+        for key, value in values.items():
+            if isinstance(value, dict):
+                nested = all(isinstance(item, dict) for item in value.values())
+                if nested:
+                    for name, item in value.items():
+                        print(f"  {key + '.' + name:<32} " + " ".join(f"{k}={v}" for k, v in item.items()))
+                    continue
+                value = " ".join(f"{k}={v}" for k, v in value.items())
+            print(f"  {key:<32} {value}")
+
+
+def main_cli(argv: list[str]) -> int:
+    parser = argparse.ArgumentParser(prog="bench.py", description="Benchmark the node agent against synthetic hosts.")
+    parser.add_argument("--servers", type=int, default=2000, help="containers in the synthetic cgroup tree")
+    parser.add_argument("--layout", choices=("v1", "v2"), default="v2", help="cgroup layout (default: v2)")
+    parser.add_argument("--rounds", type=int, default=20, help="sampling and publish rounds")
+    parser.add_argument("--status-servers", type=int, default=200, help="fake Minecraft status servers")
+    parser.add_argument("--slow-servers", type=int, default=10, help="status servers that answer late")
+    parser.add_argument("--hung-servers", type=int, default=10, help="status servers that never answer")
+    parser.add_argument("--slow-delay-sec", type=float, default=1.0)
+    parser.add_argument("--duration", type=float, default=15.0, help="full scheduler run in seconds; 0 skips it")
+    parser.add_argument("--workdir", help="where the cgroup tree is built (default: /dev/shm or the temp dir)")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args(argv)
+    if args.servers <= 0 or args.status_servers <= 0 or args.slow_servers + args.hung_servers > args.status_servers:
+        parser.error("--servers/--status-servers must be positive and cover --slow-servers + --hung-servers")
+
+    workdir = args.workdir or ("/dev/shm" if os.path.isdir("/dev/shm") else None)
+    root = tempfile.mkdtemp(prefix="node-agent-bench-", dir=workdir)
+    container_ids = [bench_container_id(index) for index in range(args.servers)]
+    tree = SyntheticCgroupTree(os.path.join(root, "cgroup"), args.layout, container_ids)
+    status_servers = FakeStatusServers(args.status_servers, args.slow_servers, args.hung_servers, args.slow_delay_sec)
+    status_ports = status_servers.ports
+    servers = [
+        main.DiscoveredServer(bench_server_id(index), container_id, status_ports[index % len(status_ports)])
+        for index, container_id in enumerate(container_ids)
+    ]
+    wings = BenchHttpServer(
+        [
+            {
+                "uuid": server.server_id,
+                "container_id": server.container_id,
+                "allocated_port": server.allocated_port,
+                "status": "running",
+            }
+            for server in servers
+        ]
+    )
+    orchestrator = BenchHttpServer()
+
+    os.environ.update(
+        {
+            "NODE_ID": "bench",
+            "NODE_TOKEN": "bench",
+            "NODE_IP": "127.0.0.1",
+            "ORCHESTRATOR_BASE_URL": orchestrator.url,
+            "WINGS_BASE_URL": wings.url,
+            "AGENT_CGROUP_ROOT": tree.root,
+        }
+    )
+    for name, value in (
+        ("AGENT_SAMPLE_INTERVAL_MIN_SEC", "1"),
+        ("AGENT_SAMPLE_INTERVAL_MAX_SEC", "1"),
+        ("AGENT_PLAYERS_INTERVAL_MIN_SEC", "5"),
+        ("AGENT_PLAYERS_INTERVAL_MAX_SEC", "5"),
+        ("AGENT_MINECRAFT_PING_TIMEOUT_SEC", "2"),
+        ("AGENT_MINECRAFT_PING_DEADLINE_SEC", "4"),
+    ):
+        os.environ.setdefault(name, value)
+    config = main.AgentConfig.from_env()
+
+    results: dict[str, dict[str, Any]] = {}
+    try:
+        started = time.perf_counter()
+        tree.build()
+        results["setup"] = {
+            "layout": args.layout,
+            "cgroup_root": tree.root,
+            "build_ms": round((time.perf_counter() - started) * 1000.0, 3),
+        }
+        wings.start()
+        orchestrator.start()
+        status_servers.start()
+
+        results["resolver"] = bench_resolver(tree, config.cgroup_miss_ttl_sec)
+        results["sampling"], payload = bench_sampling(
+            tree, servers, args.rounds, config.sample_interval_max_sec, config.contention_metrics
+        )
+        results["discovery"] = bench_discovery(config, args.rounds)
+        results["probes"] = bench_probes(config, status_servers)
+        results["publish"] = bench_publish(config, payload, args.rounds, orchestrator)
+        if config.upload_batch_size == 1:
+            results["publish_batch"] = bench_publish(
+                replace(config, upload_batch_size=10), payload, args.rounds * 10, orchestrator
+            )
+        if args.duration > 0:
+            results["agent"] = bench_agent(config, tree, args.duration, orchestrator)
+    finally:
+        status_servers.stop()
+        wings.stop()
+        orchestrator.stop()
+        shutil.rmtree(root, ignore_errors=True)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print_report(results)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli(sys.argv[1:]))
@@ -12,19 +12,46 @@ POST /internal/nodes/{node_id}/telemetry
 
 from __future__ import annotations
 
+import argparse
+import bisect
+import errno
+import gzip
+import hashlib
+import http.client
 import json
+import math
+import mmap
 import os
+import queue
 import random
+import re
+import resource
+import signal
 import socket
 import ssl
 import struct
+import sys
+import threading
 import time
-import urllib.error
 import urllib.parse
-import urllib.request
-from dataclasses import dataclass
+from array import array
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import astuple, dataclass, field, fields, replace
 from datetime import datetime, timezone
-from typing import Any, Optional
+from email.utils import parsedate_to_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Iterator, Optional
+
+try:
+    import numpy
+except ImportError:  # optional; server rates fall back to array/pure Python
+    numpy = None
+
+try:
+    import zstandard
+except ImportError:  # optional; batch uploads fall back to gzip without it
+    zstandard = None
 
 
 def log(message: str) -> None:
@@ -40,6 +67,190 @@ def read_file(path: str) -> Optional[str]:
         return None
 
 
+class LatencyHistogram:
+    # Fixed log-spaced buckets (upper bounds in seconds), safe to observe from
+    # several threads; quantiles are bucket upper bounds.
+    BOUNDS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    def __init__(self) -> None:
+        self.buckets = [0] * (len(self.BOUNDS) + 1)
+        self.count = 0
+        self.total_sec = 0.0
+        self.max_sec = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float) -> None:
+        index = bisect.bisect_left(self.BOUNDS, seconds)
+        with self._lock:
+            self.buckets[index] += 1
+            self.count += 1
+            self.total_sec += seconds
+            self.max_sec = max(self.max_sec, seconds)
+
+    def quantile(self, q: float) -> float:
+        rank = q * self.count
+        seen = 0
+        for index, bucket in enumerate(self.buckets):
+            seen += bucket
+            if seen >= rank and bucket:
+                return min(self.BOUNDS[index] if index < len(self.BOUNDS) else self.max_sec, self.max_sec)
+        return 0.0
+
+    def summary(self) -> dict[str, Any]:
+        return {
+            "count": self.count,
+            "mean_ms": round(self.total_sec / self.count * 1000.0, 3) if self.count else 0.0,
+            "p50_ms": round(self.quantile(0.5) * 1000.0, 3),
+            "p99_ms": round(self.quantile(0.99) * 1000.0, 3),
+            "max_ms": round(self.max_sec * 1000.0, 3),
+        }
+
+
+class PseudoFileReader:
+    # Keeps procfs/cgroupfs files open and re-reads them with pread into one
+    # reused buffer, so a sample costs one syscall per file instead of
+    # open/read/close. A read failure on a cached descriptor (e.g. the cgroup
+    # was removed and recreated) reopens the path once. At most max_open
+    # descriptors are cached (half the soft RLIMIT_NOFILE by default, leaving
+    # room for sockets and spool files); past that, paths are opened per read.
+    MISSING_RETRY_SEC = 60.0
+    IDLE_CLOSE_SEC = 300.0
+
+    def __init__(self, buffer_bytes: int = 65536, max_open: Optional[int] = None) -> None:
+        if max_open is None:
+            soft_limit = resource.getrlimit(resource.RLIMIT_NOFILE)[0]
+            max_open = 65536 if soft_limit == resource.RLIM_INFINITY else max(soft_limit // 2, 64)
+        self.max_open = max_open
+        self.buffer = bytearray(buffer_bytes)
+        self.reads = 0
+        self.read_bytes = 0
+        self.opens = 0
+        self._fds: dict[str, int] = {}
+        self._last_used: dict[str, float] = {}
+        self._missing_until: dict[str, float] = {}
+
+    def read(self, path: str) -> int:
+        # Returns the number of bytes now held in self.buffer, or -1.
+        now_monotonic = time.monotonic()
+        fd = self._fds.get(path)
+        if fd is None:
+            if len(self._fds) >= self.max_open:
+                return self._read_uncached(path, now_monotonic)
+            fd = self._open(path, now_monotonic)
+            if fd is None:
+                return -1
+
+        self._last_used[path] = now_monotonic
+        for attempt in range(2):
+            try:
+                length = self._pread_all(fd)
+            except OSError:
+                self.close(path)
+                if attempt == 1:
+                    return -1
+                fd = self._open(path, now_monotonic)
+                if fd is None:
+                    return -1
+                self._last_used[path] = now_monotonic
+                continue
+            return length
+
+        return -1
+
+    def read_text(self, path: str) -> Optional[str]:
+        length = self.read(path)
+        if length < 0:
+            return None
+        return self.buffer[:length].decode("utf-8", errors="replace")
+
+    def close(self, path: str) -> None:
+        fd = self._fds.pop(path, None)
+        self._last_used.pop(path, None)
+        if fd is not None:
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+    def prune(self) -> None:
+        cutoff = time.monotonic() - self.IDLE_CLOSE_SEC
+        for path, last_used in list(self._last_used.items()):
+            if last_used < cutoff:
+                self.close(path)
+        for path, retry_at in list(self._missing_until.items()):
+            if retry_at < cutoff:
+                del self._missing_until[path]
+
+    def close_all(self) -> None:
+        for path in list(self._fds):
+            self.close(path)
+
+    def _read_uncached(self, path: str, now_monotonic: float) -> int:
+        fd = self._open(path, now_monotonic, cache=False)
+        if fd is None:
+            return -1
+        try:
+            return self._pread_all(fd)
+        except OSError:
+            return -1
+        finally:
+            os.close(fd)
+
+    def _open(self, path: str, now_monotonic: float, cache: bool = True) -> Optional[int]:
+        if self._missing_until.get(path, 0.0) > now_monotonic:
+            return None
+
+        self.opens += 1
+        try:
+            fd = os.open(path, os.O_RDONLY | getattr(os, "O_CLOEXEC", 0))
+        except OSError as exc:
+            # Running out of descriptors says nothing about the path.
+            if exc.errno not in (errno.EMFILE, errno.ENFILE):
+                self._missing_until[path] = now_monotonic + self.MISSING_RETRY_SEC
+            return None
+
+        self._missing_until.pop(path, None)
+        if cache:
+            self._fds[path] = fd
+        return fd
+
+    def _pread_all(self, fd: int) -> int:
+        while True:
+            length = os.preadv(fd, [self.buffer], 0)
+            self.reads += 1
+            if length < len(self.buffer):
+                self.read_bytes += length
+                return length
+            self.buffer.extend(bytes(len(self.buffer)))
+
+
+def iter_keyed_ints(buffer: bytearray, length: int, key: bytes) -> Iterator[int]:
+    # Yields the integer after every `key` that starts a token and is
+    # followed by " " or "=", e.g. "usage_usec 123" or "wbytes=456".
+    start = 0
+    while True:
+        index = buffer.find(key, start, length)
+        if index < 0:
+            return
+
+        value_start = index + len(key) + 1
+        start = value_start
+        if index > 0 and buffer[index - 1] not in b" \n":
+            continue
+        if value_start > length or buffer[value_start - 1] not in b" =":
+            continue
+
+        value_end = value_start
+        while value_end < length and 0x30 <= buffer[value_end] <= 0x39:
+            value_end += 1
+        if value_end > value_start:
+            yield int(buffer[value_start:value_end])
+
+
+def find_keyed_int(buffer: bytearray, length: int, key: bytes) -> Optional[int]:
+    return next(iter_keyed_ints(buffer, length, key), None)
+
+
 def env_bool(name: str, default: bool) -> bool:
     raw = os.getenv(name)
     if raw is None:
@@ -64,6 +275,17 @@ def env_float(name: str, default: float) -> float:
         return default
 
 
+def env_int(name: str, default: int) -> int:
+    raw = os.getenv(name)
+    if raw is None:
+        return default
+
+    try:
+        return int(raw)
+    except ValueError:
+        return default
+
+
 @dataclass(frozen=True)
 class AgentConfig:
     node_id: str
@@ -80,7 +302,46 @@ class AgentConfig:
     players_interval_max_sec: float
     discovery_interval_sec: float
     send_backoff_max_sec: float
+    send_interval_max_sec: float
     minecraft_ping_timeout_sec: float
+    minecraft_ping_concurrency: int
+    minecraft_ping_deadline_sec: float
+    player_probes: tuple[str, ...]
+    cgroup_root: str
+    cgroup_miss_ttl_sec: float
+    contention_metrics: bool
+    self_metrics: bool
+    fast_sample_interval_sec: float
+    adaptive_sampling: bool
+    idle_cpu_pct: float
+    idle_after_sec: float
+    idle_sample_interval_sec: float
+    idle_players_interval_sec: float
+    burst_cpu_pct: float
+    burst_io_bytes_per_s: float
+    burst_sample_interval_sec: float
+    burst_duration_sec: float
+    state_file: Optional[str]
+    history_file: Optional[str]
+    history_max_bytes: int
+    local_http_addr: Optional[str]
+    trace_file: Optional[str]
+    trace_max_bytes: int
+    state_save_interval_sec: float
+    delta_encoding: bool
+    delta_keyframe_interval: int
+    delta_cpu_deadband_pct: float
+    delta_io_deadband_bytes_per_s: float
+    docker_socket: Optional[str]
+    discovery_fallback_interval_sec: float
+    spool_dir: Optional[str]
+    spool_max_bytes: int
+    spool_segment_bytes: int
+    spool_fsync_interval_sec: float
+    spool_replay_batch: int
+    upload_batch_size: int
+    upload_batch_max_age_sec: float
+    upload_compression: str
 
     @staticmethod
     def from_env() -> "AgentConfig":
@@ -111,6 +372,27 @@ class AgentConfig:
         if players_min <= 0 or players_max < players_min:
             raise ValueError("AGENT_PLAYERS_INTERVAL_* values are invalid")
 
+        ping_concurrency = env_int("AGENT_MINECRAFT_PING_CONCURRENCY", 32)
+        if ping_concurrency <= 0:
+            raise ValueError("AGENT_MINECRAFT_PING_CONCURRENCY must be positive")
+
+        spool_dir = os.getenv("AGENT_SPOOL_DIR", "").strip() or None
+        spool_max_bytes = env_int("AGENT_SPOOL_MAX_BYTES", 64 * 1024 * 1024)
+        spool_segment_bytes = env_int("AGENT_SPOOL_SEGMENT_BYTES", 1024 * 1024)
+        if spool_dir is not None and (spool_segment_bytes <= 0 or spool_max_bytes < spool_segment_bytes):
+            raise ValueError("AGENT_SPOOL_* size values are invalid")
+
+        upload_compression = os.getenv("AGENT_UPLOAD_COMPRESSION", "gzip").strip().lower()
+        if upload_compression not in {"gzip", "zstd", "none"}:
+            raise ValueError("AGENT_UPLOAD_COMPRESSION must be one of gzip, zstd, none")
+
+        player_probes = tuple(
+            name.strip().lower() for name in os.getenv("AGENT_PLAYER_PROBES", "status").split(",") if name.strip()
+        )
+        unknown_probes = [name for name in player_probes if name != "passive" and name not in PLAYER_PROBES]
+        if not player_probes or unknown_probes:
+            raise ValueError("AGENT_PLAYER_PROBES must list passive, query and/or status")
+
         return AgentConfig(
             node_id=node_id,
             node_token=node_token,
@@ -126,38 +408,158 @@ class AgentConfig:
             players_interval_max_sec=players_max,
             discovery_interval_sec=env_float("AGENT_DISCOVERY_INTERVAL_SEC", 15.0),
             send_backoff_max_sec=env_float("AGENT_SEND_BACKOFF_MAX_SEC", 60.0),
+            send_interval_max_sec=max(env_float("AGENT_SEND_INTERVAL_MAX_SEC", 600.0), 0.0),
             minecraft_ping_timeout_sec=env_float("AGENT_MINECRAFT_PING_TIMEOUT_SEC", 3.0),
+            minecraft_ping_concurrency=ping_concurrency,
+            minecraft_ping_deadline_sec=env_float("AGENT_MINECRAFT_PING_DEADLINE_SEC", 10.0),
+            player_probes=player_probes,
+            cgroup_root=os.getenv("AGENT_CGROUP_ROOT", "").strip().rstrip("/") or "/sys/fs/cgroup",
+            cgroup_miss_ttl_sec=env_float("AGENT_CGROUP_MISS_TTL_SEC", 30.0),
+            contention_metrics=env_bool("AGENT_CONTENTION_METRICS", True),
+            self_metrics=env_bool("AGENT_SELF_METRICS", False),
+            fast_sample_interval_sec=max(env_float("AGENT_FAST_SAMPLE_INTERVAL_SEC", 0.0), 0.0),
+            adaptive_sampling=env_bool("AGENT_ADAPTIVE_SAMPLING", False),
+            idle_cpu_pct=env_float("AGENT_IDLE_CPU_PCT", 2.0),
+            idle_after_sec=max(env_float("AGENT_IDLE_AFTER_SEC", 120.0), 0.0),
+            idle_sample_interval_sec=max(env_float("AGENT_IDLE_SAMPLE_INTERVAL_SEC", 60.0), 1.0),
+            idle_players_interval_sec=max(env_float("AGENT_IDLE_PLAYERS_INTERVAL_SEC", 120.0), 1.0),
+            burst_cpu_pct=env_float("AGENT_BURST_CPU_PCT", 80.0),
+            burst_io_bytes_per_s=env_float("AGENT_BURST_IO_BYTES_PER_S", 50.0 * 1024 * 1024),
+            burst_sample_interval_sec=max(env_float("AGENT_BURST_SAMPLE_INTERVAL_SEC", 1.0), 0.1),
+            burst_duration_sec=max(env_float("AGENT_BURST_DURATION_SEC", 30.0), 0.0),
+            state_file=os.getenv("AGENT_STATE_FILE", "").strip() or None,
+            history_file=os.getenv("AGENT_HISTORY_FILE", "").strip() or None,
+            history_max_bytes=max(env_int("AGENT_HISTORY_MAX_BYTES", 64 * 1024 * 1024), 1024 * 1024),
+            local_http_addr=os.getenv("AGENT_LOCAL_HTTP_ADDR", "").strip() or None,
+            trace_file=os.getenv("AGENT_TRACE_FILE", "").strip() or None,
+            trace_max_bytes=max(env_int("AGENT_TRACE_MAX_BYTES", 256 * 1024 * 1024), 1024 * 1024),
+            state_save_interval_sec=max(env_float("AGENT_STATE_SAVE_INTERVAL_SEC", 60.0), 1.0),
+            delta_encoding=env_bool("AGENT_DELTA_ENCODING", False),
+            delta_keyframe_interval=max(env_int("AGENT_DELTA_KEYFRAME_INTERVAL", 30), 1),
+            delta_cpu_deadband_pct=max(env_float("AGENT_DELTA_CPU_DEADBAND_PCT", 1.0), 0.0),
+            delta_io_deadband_bytes_per_s=max(env_float("AGENT_DELTA_IO_DEADBAND_BYTES_PER_S", 65536.0), 0.0),
+            docker_socket=os.getenv("AGENT_DOCKER_SOCKET", "").strip() or None,
+            discovery_fallback_interval_sec=env_float("AGENT_DISCOVERY_FALLBACK_INTERVAL_SEC", 300.0),
+            spool_dir=spool_dir,
+            spool_max_bytes=spool_max_bytes,
+            spool_segment_bytes=spool_segment_bytes,
+            spool_fsync_interval_sec=env_float("AGENT_SPOOL_FSYNC_INTERVAL_SEC", 5.0),
+            spool_replay_batch=max(env_int("AGENT_SPOOL_REPLAY_BATCH", 30), 1),
+            upload_batch_size=max(env_int("AGENT_UPLOAD_BATCH_SIZE", 1), 1),
+            upload_batch_max_age_sec=env_float("AGENT_UPLOAD_BATCH_MAX_AGE_SEC", 60.0),
+            upload_compression=upload_compression,
         )
 
 
-def http_json_request(
-    method: str,
-    url: str,
-    timeout_sec: float,
-    insecure_tls: bool,
-    bearer_token: Optional[str] = None,
-    payload: Optional[dict[str, Any]] = None,
-) -> Any:
-    headers = {
-        "Accept": "application/json",
-    }
+@dataclass(frozen=True)
+class HttpResponse:
+    status: int
+    headers: dict[str, str]
+    body: bytes
 
-    body: Optional[bytes] = None
-    if payload is not None:
-        body = json.dumps(payload).encode("utf-8")
-        headers["Content-Type"] = "application/json"
+    def json(self) -> Any:
+        if not self.body:
+            return {}
+        return json.loads(self.body.decode("utf-8"))
 
-    if bearer_token:
-        headers["Authorization"] = f"Bearer {bearer_token}"
 
-    request = urllib.request.Request(url=url, method=method, headers=headers, data=body)
+class HttpResponseError(Exception):
+    def __init__(self, response: HttpResponse) -> None:
+        super().__init__(f"HTTP {response.status}")
+        self.response = response
 
-    ssl_context = ssl._create_unverified_context() if insecure_tls else None
-    with urllib.request.urlopen(request, timeout=timeout_sec, context=ssl_context) as response:
-        content = response.read()
-        if not content:
-            return {}
-        return json.loads(content.decode("utf-8"))
+
+class HttpClient:
+    # Keep-alive connections pooled per (scheme, host, port) with a single
+    # shared TLS context, so periodic requests skip the TCP/TLS handshake.
+    MAX_IDLE_PER_HOST = 2
+    STALE_CONNECTION_ERRORS = (
+        http.client.RemoteDisconnected,
+        http.client.BadStatusLine,
+        ConnectionResetError,
+        ConnectionAbortedError,
+        BrokenPipeError,
+    )
+
+    def __init__(self, timeout_sec: float, insecure_tls: bool) -> None:
+        self.timeout_sec = timeout_sec
+        self._ssl_context = ssl._create_unverified_context() if insecure_tls else ssl.create_default_context()
+        self._idle: dict[tuple[str, str, int], list[http.client.HTTPConnection]] = {}
+        self._lock = threading.Lock()
+
+    def request(
+        self,
+        method: str,
+        url: str,
+        headers: Optional[dict[str, str]] = None,
+        body: Optional[bytes] = None,
+    ) -> HttpResponse:
+        parsed = urllib.parse.urlsplit(url)
+        if parsed.scheme not in {"http", "https"} or not parsed.hostname:
+            raise ValueError(f"unsupported URL: {url}")
+
+        default_port = 443 if parsed.scheme == "https" else 80
+        key = (parsed.scheme, parsed.hostname, parsed.port or default_port)
+        target = parsed.path or "/"
+        if parsed.query:
+            target = f"{target}?{parsed.query}"
+
+        while True:
+            connection, reused = self._checkout(key)
+            try:
+                connection.request(method, target, body=body, headers=headers or {})
+                raw_response = connection.getresponse()
+                content = raw_response.read()
+            except self.STALE_CONNECTION_ERRORS:
+                connection.close()
+                # The peer dropped an idle keep-alive socket; retry once on a
+                # fresh connection.
+                if reused:
+                    continue
+                raise
+            except Exception:
+                connection.close()
+                raise
+
+            if raw_response.will_close:
+                connection.close()
+            else:
+                self._checkin(key, connection)
+
+            response = HttpResponse(
+                status=raw_response.status,
+                headers={name.lower(): value for name, value in raw_response.getheaders()},
+                body=content,
+            )
+            if response.status >= 400:
+                raise HttpResponseError(response)
+            return response
+
+    def close(self) -> None:
+        with self._lock:
+            idle = [connection for connections in self._idle.values() for connection in connections]
+            self._idle.clear()
+        for connection in idle:
+            connection.close()
+
+    def _checkout(self, key: tuple[str, str, int]) -> tuple[http.client.HTTPConnection, bool]:
+        with self._lock:
+            connections = self._idle.get(key)
+            if connections:
+                return connections.pop(), True
+
+        scheme, host, port = key
+        if scheme == "https":
+            return http.client.HTTPSConnection(host, port, timeout=self.timeout_sec, context=self._ssl_context), False
+        return http.client.HTTPConnection(host, port, timeout=self.timeout_sec), False
+
+    def _checkin(self, key: tuple[str, str, int], connection: http.client.HTTPConnection) -> None:
+        with self._lock:
+            connections = self._idle.setdefault(key, [])
+            if len(connections) < self.MAX_IDLE_PER_HOST:
+                connections.append(connection)
+                return
+        connection.close()
 
 
 @dataclass(frozen=True)
@@ -176,36 +578,96 @@ class WingsDiscoverer:
         "/api/servers/list",
     )
 
-    def __init__(self, config: AgentConfig) -> None:
+    # Top-level keys that commonly hold the server list.
+    LIST_KEYS = ("data", "servers", "items")
+
+    def __init__(self, config: AgentConfig, http_client: HttpClient) -> None:
         self.config = config
+        self.http_client = http_client
+        # Sticky state from the last endpoint that answered: its payload
+        # shape, cache validators and the servers parsed from it.
+        self._endpoint: Optional[str] = None
+        self._shape: tuple[str, ...] = ()
+        self._etag: Optional[str] = None
+        self._last_modified: Optional[str] = None
+        self._body_digest: Optional[bytes] = None
+        self._servers: list[DiscoveredServer] = []
 
     def discover_servers(self) -> list[DiscoveredServer]:
         last_error: Optional[Exception] = None
 
-        for endpoint in self.CANDIDATE_ENDPOINTS:
-            url = f"{self.config.wings_base_url}{endpoint}"
+        endpoints = self.CANDIDATE_ENDPOINTS
+        if self._endpoint is not None:
+            endpoints = (self._endpoint,) + tuple(endpoint for endpoint in endpoints if endpoint != self._endpoint)
+
+        for endpoint in endpoints:
+            sticky = endpoint == self._endpoint
             try:
-                payload = http_json_request(
-                    method="GET",
-                    url=url,
-                    timeout_sec=self.config.http_timeout_sec,
-                    insecure_tls=self.config.insecure_tls,
-                    bearer_token=self.config.wings_token,
-                )
+                response = self._fetch(endpoint, conditional=sticky)
             except Exception as exc:  # noqa: BLE001
                 last_error = exc
                 continue
 
-            return self._extract_servers(payload)
+            digest = hashlib.blake2b(response.body, digest_size=16).digest()
+            if sticky and (response.status == 304 or digest == self._body_digest):
+                return list(self._servers)
+
+            try:
+                payload = response.json()
+            except ValueError as exc:
+                # A 200 with an HTML or otherwise non-JSON body is not this
+                # endpoint; try the next candidate.
+                last_error = exc
+                continue
+
+            if not sticky:
+                self._endpoint = endpoint
+                self._shape = self._detect_shape(payload)
+
+            self._etag = response.headers.get("etag")
+            self._last_modified = response.headers.get("last-modified")
+            self._body_digest = digest
+            self._servers = self._extract_servers(self._apply_shape(payload))
+            return list(self._servers)
 
         if last_error is not None:
             log(f"wings discovery failed: {last_error}")
+        self._endpoint = None
         return []
 
+    def _fetch(self, endpoint: str, conditional: bool) -> HttpResponse:
+        headers = {
+            "Accept": "application/json",
+        }
+        if self.config.wings_token:
+            headers["Authorization"] = f"Bearer {self.config.wings_token}"
+        if conditional and self._etag:
+            headers["If-None-Match"] = self._etag
+        if conditional and self._last_modified:
+            headers["If-Modified-Since"] = self._last_modified
+
+        return self.http_client.request("GET", f"{self.config.wings_base_url}{endpoint}", headers=headers)
+
+    def _detect_shape(self, payload: Any) -> tuple[str, ...]:
+        if isinstance(payload, dict):
+            for key in self.LIST_KEYS:
+                if isinstance(payload.get(key), list):
+                    return (key,)
+        return ()
+
+    def _apply_shape(self, payload: Any) -> Any:
+        current = payload
+        for key in self._shape:
+            if not isinstance(current, dict) or key not in current:
+                # The endpoint changed its envelope; fall back to a full walk.
+                return payload
+            current = current[key]
+        return current
+
     def _extract_servers(self, payload: Any) -> list[DiscoveredServer]:
         discovered: dict[str, DiscoveredServer] = {}
 
-        for candidate in self._iter_dicts(payload):
+        for candidate in self._iter_server_dicts(payload):
             server_id = self._extract_server_id(candidate)
             container_id = self._extract_container_id(candidate)
             port = self._extract_allocated_port(candidate)
@@ -224,21 +686,20 @@ class WingsDiscoverer:
 
         return sorted(discovered.values(), key=lambda server: server.server_id)
 
-    def _iter_dicts(self, value: Any) -> list[dict[str, Any]]:
+    def _iter_server_dicts(self, value: Any) -> Iterator[dict[str, Any]]:
         stack = [value]
-        results: list[dict[str, Any]] = []
 
         while stack:
             current = stack.pop()
             if isinstance(current, dict):
-                results.append(current)
-                for child in current.values():
-                    stack.append(child)
+                yield current
+                # A dict that already describes a server is not searched for
+                # nested servers.
+                if self._extract_server_id(current) is not None and self._extract_container_id(current) is not None:
+                    continue
+                stack.extend(current.values())
             elif isinstance(current, list):
-                for child in current:
-                    stack.append(child)
-
-        return results
+                stack.extend(current)
 
     def _extract_server_id(self, data: dict[str, Any]) -> Optional[str]:
         for key in ("server_id", "uuid", "identifier", "id"):
@@ -332,30 +793,334 @@ class WingsDiscoverer:
         return True
 
 
+@dataclass(frozen=True)
+class ContainerEvent:
+    action: str
+    container_id: str
+    name: Optional[str]
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, socket_path: str, timeout: Optional[float] = None) -> None:
+        super().__init__("localhost", timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self) -> None:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(self.socket_path)
+        except OSError:
+            sock.close()
+            raise
+        self.sock = sock
+
+
+class DockerEventWatcher:
+    # Streams container lifecycle events from the local Docker Engine API on a
+    # background thread. A "resync" event is queued on every (re)connect,
+    # because events may have been missed while disconnected.
+    ACTIONS = ("start", "die", "destroy")
+    RECONNECT_SEC = 5.0
+
+    def __init__(self, socket_path: str) -> None:
+        self.socket_path = socket_path
+        self.connected = False
+        self._events: queue.SimpleQueue[ContainerEvent] = queue.SimpleQueue()
+        self._stopped = threading.Event()
+        self._connection: Optional[UnixHTTPConnection] = None
+        self._thread = threading.Thread(target=self._run, name="docker-events", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        connection = self._connection
+        # close() would wait for the buffered reader held by the blocked
+        # readline(); shutting the socket down wakes that read instead.
+        sock = connection.sock if connection is not None else None
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def drain(self) -> list[ContainerEvent]:
+        events: list[ContainerEvent] = []
+        while True:
+            try:
+                events.append(self._events.get_nowait())
+            except queue.Empty:
+                return events
+
+    def _run(self) -> None:
+        while not self._stopped.is_set():
+            try:
+                self._stream()
+            except Exception as exc:  # noqa: BLE001
+                if not self._stopped.is_set():
+                    log(f"docker event stream failed: {exc}")
+            self.connected = False
+            self._stopped.wait(self.RECONNECT_SEC)
+
+    def _stream(self) -> None:
+        filters = json.dumps({"type": ["container"], "event": list(self.ACTIONS)})
+        connection = UnixHTTPConnection(self.socket_path)
+        self._connection = connection
+        try:
+            connection.request("GET", f"/events?filters={urllib.parse.quote(filters)}")
+            response = connection.getresponse()
+            if response.status != 200:
+                raise ConnectionError(f"docker events HTTP {response.status}")
+
+            self.connected = True
+            self._events.put(ContainerEvent(action="resync", container_id="", name=None))
+
+            while not self._stopped.is_set():
+                line = response.readline()
+                if not line:
+                    raise ConnectionError("docker event stream closed")
+                event = self._parse(line)
+                if event is not None:
+                    self._events.put(event)
+        finally:
+            self._connection = None
+            connection.close()
+
+    def _parse(self, line: bytes) -> Optional[ContainerEvent]:
+        try:
+            data = json.loads(line)
+        except ValueError:
+            return None
+        if not isinstance(data, dict):
+            return None
+
+        action = data.get("Action", data.get("status"))
+        actor = data.get("Actor") if isinstance(data.get("Actor"), dict) else {}
+        container_id = actor.get("ID", data.get("id"))
+        if action not in self.ACTIONS or not isinstance(container_id, str) or not container_id:
+            return None
+
+        attributes = actor.get("Attributes") if isinstance(actor.get("Attributes"), dict) else {}
+        name = attributes.get("name")
+        return ContainerEvent(
+            action=action,
+            container_id=container_id,
+            name=name.lstrip("/") if isinstance(name, str) and name else None,
+        )
+
+
+def apply_container_events(
+    events: list[ContainerEvent],
+    discovered_servers: list[DiscoveredServer],
+    known_servers: dict[str, DiscoveredServer],
+) -> tuple[list[DiscoveredServer], bool]:
+    # Returns the updated running set and whether a full Wings
+    # reconciliation is needed (unknown container, or a stream resync).
+    running = {server.server_id: server for server in discovered_servers}
+    reconcile = False
+
+    for event in events:
+        if event.action == "resync":
+            reconcile = True
+        elif event.action == "start":
+            # Wings names each server's container after the server uuid and
+            # recreates it on every start, so match on name, not id.
+            known = known_servers.get(event.name or "")
+            if known is None:
+                reconcile = True
+                continue
+            server = DiscoveredServer(
+                server_id=known.server_id,
+                container_id=event.container_id,
+                allocated_port=known.allocated_port,
+            )
+            known_servers[server.server_id] = server
+            running[server.server_id] = server
+        else:
+            for server_id, server in list(running.items()):
+                if container_ids_match(server.container_id, event.container_id):
+                    del running[server_id]
+
+    return sorted(running.values(), key=lambda server: server.server_id), reconcile
+
+
+def container_ids_match(left: str, right: str) -> bool:
+    shorter, longer = sorted((left, right), key=len)
+    return len(shorter) >= 12 and longer.startswith(shorter)
+
+
 class CgroupResolver:
-    def __init__(self, cgroup_root: str = "/sys/fs/cgroup") -> None:
+    # Resolves container ids to cgroup directories from a single index of the
+    # hierarchy keyed by id fragments. The index is rebuilt at most every
+    # INDEX_MIN_REBUILD_SEC: on a lookup miss, when a watched parent
+    # directory's mtime changes, or after INDEX_MAX_AGE_SEC. Misses are
+    # negatively cached for miss_ttl_sec.
+    INDEX_MIN_REBUILD_SEC = 5.0
+    INDEX_MAX_AGE_SEC = 300.0
+    CHANGE_CHECK_INTERVAL_SEC = 1.0
+    ID_FRAGMENT_PATTERN = re.compile(r"[0-9a-fA-F-]{12,}")
+
+    def __init__(self, cgroup_root: str = "/sys/fs/cgroup", miss_ttl_sec: float = 30.0) -> None:
         self.cgroup_root = cgroup_root
-        self._cache: dict[str, Optional[str]] = {}
+        self.miss_ttl_sec = miss_ttl_sec
+        self.unified = os.path.exists(os.path.join(cgroup_root, "cgroup.controllers"))
+        self.hits = 0
+        self.misses = 0
+        self.index_rebuilds = 0
+        self.resolve_latency = LatencyHistogram()
+        self._cache: dict[str, str] = {}
+        self._miss_until: dict[str, float] = {}
+        self._index: dict[str, str] = {}
+        self._index_built_at: Optional[float] = None
+        self._watched_mtimes: dict[str, int] = {}
+        self._changed = False
+        self._changed_checked_at = 0.0
 
     def resolve(self, container_id: str) -> Optional[str]:
-        if container_id in self._cache:
-            cached = self._cache[container_id]
-            if cached and os.path.isdir(cached):
-                return cached
+        started = time.perf_counter()
+        try:
+            return self._resolve(container_id)
+        finally:
+            self.resolve_latency.observe(time.perf_counter() - started)
+
+    def _resolve(self, container_id: str) -> Optional[str]:
+        # Cached paths are trusted; callers invalidate them when reads fail.
+        cached = self._cache.get(container_id)
+        if cached is not None:
+            self.hits += 1
+            return cached
+
+        now_monotonic = time.monotonic()
+        if self._miss_until.get(container_id, 0.0) > now_monotonic and not self._index_changed(now_monotonic):
+            self.misses += 1
+            return None
 
         identifiers = [container_id]
         if len(container_id) >= 12:
             identifiers.append(container_id[:12])
 
+        path = self._lookup(identifiers)
+        if path is None and self._can_rebuild(now_monotonic):
+            self._rebuild_index(now_monotonic)
+            path = self._lookup(identifiers)
+
+        if path is None:
+            self._miss_until[container_id] = now_monotonic + self.miss_ttl_sec
+            self.misses += 1
+            return None
+
+        self._miss_until.pop(container_id, None)
+        self._cache[container_id] = path
+        self.hits += 1
+        return path
+
+    def invalidate(self, container_id: str) -> None:
+        self._cache.pop(container_id, None)
+
+    def export_paths(self) -> dict[str, str]:
+        return dict(self._cache)
+
+    def restore_paths(self, paths: dict[str, str]) -> None:
+        # Only paths that still exist; the rest resolve normally.
+        for container_id, path in paths.items():
+            if os.path.isdir(path):
+                self._cache[container_id] = path
+
+    def controller_path(self, cgroup_path: str, controller: str) -> str:
+        # cgroup v1 mounts each controller separately; map a path resolved in
+        # the cpu hierarchy onto the same cgroup under another controller.
+        if self.unified:
+            return cgroup_path
+        relative = os.path.relpath(cgroup_path, self.cgroup_root).split(os.sep)
+        return os.path.join(self.cgroup_root, controller, *relative[1:])
+
+    def forget_except(self, container_ids: set[str]) -> None:
+        for cache in (self._cache, self._miss_until):
+            for container_id in [key for key in cache if key not in container_ids]:
+                del cache[container_id]
+
+    def _lookup(self, identifiers: list[str]) -> Optional[str]:
+        for identifier in identifiers:
+            indexed = self._index.get(identifier)
+            if indexed is not None and self._looks_like_cgroup_path(indexed):
+                return indexed
+
         for identifier in identifiers:
             for candidate in self._candidate_paths(identifier):
                 if self._looks_like_cgroup_path(candidate):
-                    self._cache[container_id] = candidate
                     return candidate
 
-        discovered = self._search_cgroup_tree(identifiers)
-        self._cache[container_id] = discovered
-        return discovered
+        return None
+
+    def _can_rebuild(self, now_monotonic: float) -> bool:
+        return self._index_built_at is None or now_monotonic - self._index_built_at >= self.INDEX_MIN_REBUILD_SEC
+
+    def _index_changed(self, now_monotonic: float) -> bool:
+        if self._index_built_at is None or now_monotonic - self._index_built_at >= self.INDEX_MAX_AGE_SEC:
+            return self._can_rebuild(now_monotonic)
+        if not self._can_rebuild(now_monotonic):
+            return False
+
+        if now_monotonic - self._changed_checked_at >= self.CHANGE_CHECK_INTERVAL_SEC:
+            self._changed_checked_at = now_monotonic
+            self._changed = any(
+                self._mtime_ns(directory) != mtime_ns
+                for directory, mtime_ns in self._watched_mtimes.items()
+            )
+        return self._changed
+
+    def _rebuild_index(self, now_monotonic: float) -> None:
+        index: dict[str, str] = {}
+        ambiguous: set[str] = set()
+        parents: set[str] = {self.cgroup_root}
+
+        if os.path.isdir(self.cgroup_root):
+            for current_root, dir_names, _ in os.walk(self.cgroup_root):
+                container_dirs: list[str] = []
+                for dir_name in dir_names:
+                    fragments = [
+                        fragment.strip("-")
+                        for fragment in self.ID_FRAGMENT_PATTERN.findall(dir_name)
+                        if len(fragment.strip("-")) >= 12
+                    ]
+                    if not fragments:
+                        continue
+
+                    candidate = os.path.join(current_root, dir_name)
+                    if not self._looks_like_cgroup_path(candidate):
+                        continue
+
+                    container_dirs.append(dir_name)
+                    parents.add(current_root)
+                    for fragment in fragments:
+                        index.setdefault(fragment, candidate)
+                        short = fragment[:12]
+                        if index.setdefault(short, candidate) != candidate:
+                            ambiguous.add(short)
+
+                # Container cgroups are leaves for our purposes; do not walk
+                # their children.
+                if container_dirs:
+                    dir_names[:] = [name for name in dir_names if name not in container_dirs]
+
+        # A short id shared by several cgroups cannot be resolved safely.
+        for short in ambiguous:
+            index.pop(short, None)
+
+        self._index = index
+        self._index_built_at = now_monotonic
+        self._watched_mtimes = {directory: self._mtime_ns(directory) for directory in parents}
+        self._changed = False
+        self._changed_checked_at = now_monotonic
+        self.index_rebuilds += 1
+
+    def _mtime_ns(self, directory: str) -> int:
+        try:
+            return os.stat(directory).st_mtime_ns
+        except OSError:
+            return -1
 
     def _candidate_paths(self, identifier: str) -> list[str]:
         root = self.cgroup_root
@@ -367,69 +1132,74 @@ class CgroupResolver:
         ]
 
     def _looks_like_cgroup_path(self, path: str) -> bool:
-        if not os.path.isdir(path):
-            return False
-
         return any(
             os.path.exists(os.path.join(path, filename))
             for filename in ("cpu.stat", "cpuacct.usage")
         )
 
-    def _search_cgroup_tree(self, identifiers: list[str]) -> Optional[str]:
-        if not os.path.isdir(self.cgroup_root):
-            return None
-
-        for current_root, dir_names, _ in os.walk(self.cgroup_root):
-            for dir_name in dir_names:
-                if not any(identifier in dir_name for identifier in identifiers):
-                    continue
 
-                candidate = os.path.join(current_root, dir_name)
-                if self._looks_like_cgroup_path(candidate):
-                    return candidate
-
-        return None
-
-
-def read_cgroup_cpu_usage_usec(cgroup_path: str) -> Optional[int]:
-    cpu_stat = read_file(os.path.join(cgroup_path, "cpu.stat"))
-    if cpu_stat:
-        for line in cpu_stat.splitlines():
-            parts = line.strip().split()
-            if len(parts) != 2:
-                continue
-            key, raw_value = parts
-            if not raw_value.isdigit():
-                continue
-            if key == "usage_usec":
-                return int(raw_value)
-            if key == "usage_nsec":
-                return int(raw_value) // 1000
-
-    cpuacct_usage = read_file(os.path.join(cgroup_path, "cpuacct.usage"))
+def read_cgroup_cpu_usage_usec(
+    reader: PseudoFileReader,
+    cgroup_path: str,
+    counters: Optional[dict[str, int]] = None,
+) -> Optional[int]:
+    length = reader.read(os.path.join(cgroup_path, "cpu.stat"))
+    if length > 0:
+        if counters is not None:
+            # Throttling counters share cpu.stat with usage (v1 cpu.stat has
+            # them too, in nanoseconds), so pick them up from the same read.
+            for key, counter in ((b"nr_periods", "cpu_nr_periods"), (b"nr_throttled", "cpu_nr_throttled")):
+                value = find_keyed_int(reader.buffer, length, key)
+                if value is not None:
+                    counters[counter] = value
+            throttled_usec = find_keyed_int(reader.buffer, length, b"throttled_usec")
+            if throttled_usec is None:
+                throttled_nsec = find_keyed_int(reader.buffer, length, b"throttled_time")
+                throttled_usec = throttled_nsec // 1000 if throttled_nsec is not None else None
+            if throttled_usec is not None:
+                counters["cpu_throttled_usec"] = throttled_usec
+
+        usage_usec = find_keyed_int(reader.buffer, length, b"usage_usec")
+        if usage_usec is not None:
+            return usage_usec
+        usage_nsec = find_keyed_int(reader.buffer, length, b"usage_nsec")
+        if usage_nsec is not None:
+            return usage_nsec // 1000
+
+    cpuacct_usage = reader.read_text(os.path.join(cgroup_path, "cpuacct.usage"))
     if cpuacct_usage and cpuacct_usage.strip().isdigit():
         return int(cpuacct_usage.strip()) // 1000
 
     return None
 
 
-def read_cgroup_write_bytes(cgroup_path: str) -> Optional[int]:
-    io_stat = read_file(os.path.join(cgroup_path, "io.stat"))
-    if io_stat:
-        total_write = 0
-        found = False
-        for line in io_stat.splitlines():
-            for field in line.strip().split():
-                if not field.startswith("wbytes="):
-                    continue
-                raw_value = field.split("=", 1)[1]
-                if raw_value.isdigit():
-                    total_write += int(raw_value)
-                    found = True
-        if found:
-            return total_write
+def read_cgroup_cpu_quota_pct(reader: PseudoFileReader, cgroup_path: str) -> Optional[float]:
+    # CPU limit as a percentage of one core (200.0 = two cores); None when
+    # the cgroup is unlimited.
+    cpu_max = reader.read_text(os.path.join(cgroup_path, "cpu.max"))
+    if cpu_max is not None:
+        parts = cpu_max.split()
+        if len(parts) == 2 and parts[0].isdigit() and parts[1].isdigit() and int(parts[1]) > 0:
+            return int(parts[0]) / int(parts[1]) * 100.0
+        return None
 
-    blkio_stat = read_file(os.path.join(cgroup_path, "blkio.throttle.io_service_bytes"))
+    quota = reader.read_text(os.path.join(cgroup_path, "cpu.cfs_quota_us"))
+    period = reader.read_text(os.path.join(cgroup_path, "cpu.cfs_period_us"))
+    if quota is None or period is None or not quota.strip().isdigit() or not period.strip().isdigit():
+        # A v1 quota of -1 means unlimited.
+        return None
+    if int(period) <= 0:
+        return None
+    return int(quota) / int(period) * 100.0
+
+
+def read_cgroup_write_bytes(reader: PseudoFileReader, cgroup_path: str) -> Optional[int]:
+    length = reader.read(os.path.join(cgroup_path, "io.stat"))
+    if length >= 0:
+        # An empty io.stat means no I/O has been accounted yet.
+        return sum(iter_keyed_ints(reader.buffer, length, b"wbytes"))
+
+    blkio_stat = reader.read_text(os.path.join(cgroup_path, "blkio.throttle.io_service_bytes"))
     if blkio_stat:
         total_write = 0
         found = False
@@ -447,91 +1217,435 @@ def read_cgroup_write_bytes(cgroup_path: str) -> Optional[int]:
     return None
 
 
+def read_pressure_file(reader: PseudoFileReader, path: str, resource: str, counters: dict[str, int]) -> None:
+    # PSI files hold a "some" line and (except cpu on older kernels) a "full"
+    # line; only the cumulative total= stall times in usec are used.
+    length = reader.read(path)
+    if length <= 0:
+        return
+
+    for kind, total in zip(("some", "full"), iter_keyed_ints(reader.buffer, length, b"total")):
+        counters[f"{resource}_pressure_{kind}_usec"] = total
+
+
+def read_cgroup_pressure(reader: PseudoFileReader, cgroup_path: str, resource: str, counters: dict[str, int]) -> None:
+    read_pressure_file(reader, os.path.join(cgroup_path, f"{resource}.pressure"), resource, counters)
+
+
+def read_cgroup_memory(reader: PseudoFileReader, cgroup_path: str, counters: dict[str, int], gauges: dict[str, int]) -> None:
+    length = reader.read(os.path.join(cgroup_path, "memory.current"))
+    if length < 0:
+        length = reader.read(os.path.join(cgroup_path, "memory.usage_in_bytes"))
+    if length > 0 and reader.buffer[:length].strip().isdigit():
+        gauges["memory_current_bytes"] = int(reader.buffer[:length])
+
+    length = reader.read(os.path.join(cgroup_path, "memory.stat"))
+    if length <= 0:
+        return
+
+    # v2 names first, v1 names as fallback.
+    for gauge, keys in (("memory_anon_bytes", (b"anon", b"rss")), ("memory_file_bytes", (b"file", b"cache"))):
+        for key in keys:
+            value = find_keyed_int(reader.buffer, length, key)
+            if value is not None:
+                gauges[gauge] = value
+                break
+
+    major_faults = find_keyed_int(reader.buffer, length, b"pgmajfault")
+    if major_faults is not None:
+        counters["memory_major_faults"] = major_faults
+
+
+class MetricWindow:
+    # Fixed-capacity ring of float samples collected over one publish window.
+    def __init__(self, capacity: int) -> None:
+        self._values = array("d", bytes(8 * max(capacity, 1)))
+        self._count = 0
+        self._next = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def add(self, value: float) -> None:
+        self._values[self._next] = value
+        self._next = (self._next + 1) % len(self._values)
+        self._count = min(self._count + 1, len(self._values))
+
+    def summary(self) -> Optional[tuple[float, float, float, float]]:
+        # (min, max, mean, p95) using the nearest-rank percentile.
+        if not self._count:
+            return None
+
+        values = sorted(self._values[: self._count])
+        p95 = values[max(math.ceil(0.95 * len(values)) - 1, 0)]
+        return values[0], values[-1], sum(values) / len(values), p95
+
+    def clear(self) -> None:
+        self._count = 0
+        self._next = 0
+
+
+class ServerCounterStore:
+    # Struct-of-arrays cpu/io baselines with one slot per server, so the
+    # rates of all sampled servers are computed in one batched pass (NumPy
+    # when installed, array("d") otherwise).
+    def __init__(self, capacity: int = 64) -> None:
+        self._capacity = 0
+        self._free: list[int] = []
+        self._cpu_usage_usec = self._new_array(0)
+        self._write_bytes = self._new_array(0)
+        self._sample_monotonic = self._new_array(0)
+        self._has_baseline = self._new_array(0)
+        self._grow(capacity)
+
+    def __len__(self) -> int:
+        return self._capacity - len(self._free)
+
+    @staticmethod
+    def _new_array(size: int) -> Any:
+        if numpy is not None:
+            return numpy.zeros(size, dtype=numpy.float64)
+        return array("d", bytes(8 * size))
+
+    def _grow(self, size: int) -> None:
+        for name in ("_cpu_usage_usec", "_write_bytes", "_sample_monotonic", "_has_baseline"):
+            grown = self._new_array(size)
+            grown[: self._capacity] = getattr(self, name)[: self._capacity]
+            setattr(self, name, grown)
+        # Reversed so that low slots are handed out first.
+        self._free.extend(range(size - 1, self._capacity - 1, -1))
+        self._capacity = size
+
+    def allocate(self) -> int:
+        if not self._free:
+            self._grow(max(self._capacity * 2, 64))
+        slot = self._free.pop()
+        self._has_baseline[slot] = 0.0
+        return slot
+
+    def release(self, slot: int) -> None:
+        if 0 <= slot < self._capacity:
+            self._has_baseline[slot] = 0.0
+            self._free.append(slot)
+
+    def export_slot(self, slot: int) -> Optional[list[float]]:
+        if not 0 <= slot < self._capacity or not self._has_baseline[slot]:
+            return None
+        return [float(self._cpu_usage_usec[slot]), float(self._write_bytes[slot]), float(self._sample_monotonic[slot])]
+
+    def restore_slot(self, slot: int, values: list[float]) -> None:
+        self._cpu_usage_usec[slot], self._write_bytes[slot], self._sample_monotonic[slot] = values
+        self._has_baseline[slot] = 1.0
+
+    def update(
+        self,
+        slots: list[int],
+        cpu_usage_usec: list[int],
+        write_bytes: list[int],
+        now_monotonic: float,
+    ) -> tuple[list[Optional[float]], list[Optional[float]]]:
+        # Stores the new counters and returns (cpu_pct, io_write_bytes_per_s)
+        # per slot; None where there is no previous sample to diff against.
+        if not slots:
+            return [], []
+
+        if numpy is not None:
+            index = numpy.asarray(slots, dtype=numpy.intp)
+            cpu = numpy.asarray(cpu_usage_usec, dtype=numpy.float64)
+            written = numpy.asarray(write_bytes, dtype=numpy.float64)
+            elapsed = now_monotonic - self._sample_monotonic[index]
+            valid = (self._has_baseline[index] > 0.0) & (elapsed > 0.0)
+            elapsed = numpy.where(valid, elapsed, 1.0)
+            cpu_pct = numpy.maximum(cpu - self._cpu_usage_usec[index], 0.0) / (elapsed * 1_000_000.0) * 100.0
+            io_rate = numpy.maximum(written - self._write_bytes[index], 0.0) / elapsed
+
+            self._cpu_usage_usec[index] = cpu
+            self._write_bytes[index] = written
+            self._sample_monotonic[index] = now_monotonic
+            self._has_baseline[index] = 1.0
+
+            valid_list = valid.tolist()
+            return (
+                [value if ok else None for value, ok in zip(cpu_pct.tolist(), valid_list)],
+                [value if ok else None for value, ok in zip(io_rate.tolist(), valid_list)],
+            )
+
+        cpu_pcts: list[Optional[float]] = []
+        io_rates: list[Optional[float]] = []
+        last_cpu = self._cpu_usage_usec
+        last_written = self._write_bytes
+        last_monotonic = self._sample_monotonic
+        has_baseline = self._has_baseline
+        for slot, cpu_value, written_value in zip(slots, cpu_usage_usec, write_bytes):
+            elapsed = now_monotonic - last_monotonic[slot]
+            if has_baseline[slot] and elapsed > 0:
+                cpu_pcts.append(max(cpu_value - last_cpu[slot], 0.0) / (elapsed * 1_000_000.0) * 100.0)
+                io_rates.append(max(written_value - last_written[slot], 0.0) / elapsed)
+            else:
+                cpu_pcts.append(None)
+                io_rates.append(None)
+            last_cpu[slot] = cpu_value
+            last_written[slot] = written_value
+            last_monotonic[slot] = now_monotonic
+            has_baseline[slot] = 1.0
+
+        return cpu_pcts, io_rates
+
+
 @dataclass
 class ServerRuntimeState:
-    last_cpu_usage_usec: Optional[int] = None
-    last_write_bytes: Optional[int] = None
-    last_sample_monotonic: Optional[float] = None
+    slot: int = -1
+    last_counters: dict[str, int] = field(default_factory=dict)
+    last_counters_monotonic: Optional[float] = None
+    cpu_window: Optional[MetricWindow] = None
+    io_window: Optional[MetricWindow] = None
     players_online: Optional[int] = None
     next_players_probe_epoch: float = 0.0
+    last_metrics: Optional["ServerMetrics"] = None
+    last_active_monotonic: Optional[float] = None
+    burst_until_monotonic: float = 0.0
+    next_sample_monotonic: float = 0.0
+    next_fast_sample_monotonic: float = 0.0
 
 
 @dataclass(frozen=True)
 class NodeMetrics:
     cpu_pct: float
     iowait_pct: float
+    steal_pct: float = 0.0
+    irq_pct: float = 0.0
+    softirq_pct: float = 0.0
+    core_busy_pct: tuple[float, ...] = ()
+    max_core_pct: float = 0.0
+    core_imbalance_pct: float = 0.0
+    load1: Optional[float] = None
+    load5: Optional[float] = None
+    load15: Optional[float] = None
+    cpu_pressure_some_pct: Optional[float] = None
+    io_pressure_some_pct: Optional[float] = None
+    io_pressure_full_pct: Optional[float] = None
+    memory_pressure_some_pct: Optional[float] = None
+    memory_pressure_full_pct: Optional[float] = None
+
+
+EMPTY_NODE_METRICS = NodeMetrics(cpu_pct=0.0, iowait_pct=0.0)
 
 
 @dataclass(frozen=True)
-class ProcStatSnapshot:
+class CpuTimes:
     total: int
     idle: int
     iowait: int
+    irq: int
+    softirq: int
+    steal: int
+
 
+@dataclass(frozen=True)
+class ProcStatSnapshot:
+    aggregate: CpuTimes
+    cores: dict[str, CpuTimes]
 
-def read_proc_stat_snapshot() -> Optional[ProcStatSnapshot]:
-    proc_stat = read_file("/proc/stat")
-    if proc_stat is None:
+
+def parse_cpu_times(parts: list[bytes]) -> Optional[CpuTimes]:
+    # cpu user nice system idle iowait irq softirq steal guest guest_nice
+    # guest/guest_nice are already included in user/nice, so they are not
+    # added to the total.
+    if len(parts) < 6 or not all(token.isdigit() for token in parts[1:]):
+        return None
+
+    values = [int(token) for token in parts[1:9]]
+    values.extend([0] * (8 - len(values)))
+    return CpuTimes(
+        total=sum(values),
+        idle=values[3],
+        iowait=values[4],
+        irq=values[5],
+        softirq=values[6],
+        steal=values[7],
+    )
+
+
+def read_proc_stat_snapshot(reader: PseudoFileReader) -> Optional[ProcStatSnapshot]:
+    length = reader.read("/proc/stat")
+    if length < 0:
         return None
 
-    for line in proc_stat.splitlines():
-        if not line.startswith("cpu "):
+    # All cpu lines come first; stop at the first other line.
+    aggregate: Optional[CpuTimes] = None
+    cores: dict[str, CpuTimes] = {}
+    position = 0
+    while position < length and reader.buffer.startswith(b"cpu", position):
+        line_end = reader.buffer.find(b"\n", position, length)
+        if line_end < 0:
+            line_end = length
+        parts = reader.buffer[position:line_end].split()
+        position = line_end + 1
+
+        times = parse_cpu_times(parts)
+        if times is None:
             continue
+        if parts[0] == b"cpu":
+            aggregate = times
+        else:
+            cores[parts[0].decode("ascii")] = times
 
-        parts = line.split()
-        # cpu user nice system idle iowait irq softirq steal guest guest_nice
-        if len(parts) < 6:
-            return None
+    if aggregate is None:
+        return None
+    return ProcStatSnapshot(aggregate=aggregate, cores=cores)
 
-        values: list[int] = []
-        for token in parts[1:]:
-            if token.isdigit():
-                values.append(int(token))
-            else:
-                return None
 
-        if len(values) < 5:
-            return None
+def cpu_time_shares(current: CpuTimes, previous: CpuTimes) -> Optional[dict[str, float]]:
+    total_delta = current.total - previous.total
+    if total_delta <= 0:
+        return None
 
-        total = sum(values)
-        idle = values[3]
-        iowait = values[4]
-        return ProcStatSnapshot(total=total, idle=idle, iowait=iowait)
+    idle_delta = max(current.idle - previous.idle, 0)
+    iowait_delta = max(current.iowait - previous.iowait, 0)
+    steal_delta = max(current.steal - previous.steal, 0)
+    # Steal is time the hypervisor gave to other guests, not our load.
+    busy_delta = max(total_delta - idle_delta - iowait_delta - steal_delta, 0)
+
+    return {
+        "busy": (busy_delta / total_delta) * 100.0,
+        "iowait": (iowait_delta / total_delta) * 100.0,
+        "steal": (steal_delta / total_delta) * 100.0,
+        "irq": (max(current.irq - previous.irq, 0) / total_delta) * 100.0,
+        "softirq": (max(current.softirq - previous.softirq, 0) / total_delta) * 100.0,
+    }
 
-    return None
+
+def read_loadavg(reader: PseudoFileReader) -> Optional[tuple[float, float, float]]:
+    loadavg = reader.read_text("/proc/loadavg")
+    if loadavg is None:
+        return None
+
+    parts = loadavg.split()
+    try:
+        return float(parts[0]), float(parts[1]), float(parts[2])
+    except (IndexError, ValueError):
+        return None
 
 
 class NodeMetricTracker:
-    def __init__(self) -> None:
-        self._previous: Optional[ProcStatSnapshot] = None
+    PRESSURE_FIELDS = (
+        ("cpu_pressure_some_usec", "cpu_pressure_some_pct"),
+        ("io_pressure_some_usec", "io_pressure_some_pct"),
+        ("io_pressure_full_usec", "io_pressure_full_pct"),
+        ("memory_pressure_some_usec", "memory_pressure_some_pct"),
+        ("memory_pressure_full_usec", "memory_pressure_full_pct"),
+    )
 
-    def sample(self) -> NodeMetrics:
-        current = read_proc_stat_snapshot()
-        if current is None:
-            return NodeMetrics(cpu_pct=0.0, iowait_pct=0.0)
+    def __init__(self, reader: PseudoFileReader) -> None:
+        self.reader = reader
+        self._previous: Optional[ProcStatSnapshot] = None
+        self._previous_pressure: dict[str, int] = {}
+        self._previous_monotonic: Optional[float] = None
 
-        if self._previous is None:
-            self._previous = current
-            return NodeMetrics(cpu_pct=0.0, iowait_pct=0.0)
+    def export_state(self) -> Optional[dict[str, Any]]:
+        if self._previous is None or self._previous_monotonic is None:
+            return None
+        return {
+            "aggregate": astuple(self._previous.aggregate),
+            "cores": {name: astuple(times) for name, times in self._previous.cores.items()},
+            "pressure": self._previous_pressure,
+            "monotonic": self._previous_monotonic,
+        }
+
+    def restore_state(self, data: dict[str, Any]) -> None:
+        self._previous = ProcStatSnapshot(
+            aggregate=CpuTimes(*data["aggregate"]),
+            cores={name: CpuTimes(*times) for name, times in data["cores"].items()},
+        )
+        self._previous_pressure = {key: int(value) for key, value in data["pressure"].items()}
+        self._previous_monotonic = float(data["monotonic"])
 
-        total_delta = current.total - self._previous.total
-        idle_delta = current.idle - self._previous.idle
-        iowait_delta = current.iowait - self._previous.iowait
+    def sample(self, now_monotonic: Optional[float] = None) -> NodeMetrics:
+        if now_monotonic is None:
+            now_monotonic = time.monotonic()
+        current = read_proc_stat_snapshot(self.reader)
+        if current is None:
+            return EMPTY_NODE_METRICS
+
+        extras: dict[str, Any] = {}
+        loadavg = read_loadavg(self.reader)
+        if loadavg is not None:
+            extras["load1"], extras["load5"], extras["load15"] = loadavg
+
+        pressure: dict[str, int] = {}
+        for resource in ("cpu", "io", "memory"):
+            read_pressure_file(self.reader, f"/proc/pressure/{resource}", resource, pressure)
+        if self._previous_monotonic is not None and now_monotonic > self._previous_monotonic:
+            elapsed = now_monotonic - self._previous_monotonic
+            for counter, metric in self.PRESSURE_FIELDS:
+                if counter in pressure and counter in self._previous_pressure:
+                    delta = max(pressure[counter] - self._previous_pressure[counter], 0)
+                    extras[metric] = (delta / elapsed) * 1e-4
+        self._previous_pressure = pressure
+        self._previous_monotonic = now_monotonic
+
+        previous = self._previous
         self._previous = current
+        if previous is None:
+            return NodeMetrics(cpu_pct=0.0, iowait_pct=0.0, **extras)
 
-        if total_delta <= 0:
-            return NodeMetrics(cpu_pct=0.0, iowait_pct=0.0)
+        shares = cpu_time_shares(current.aggregate, previous.aggregate)
+        if shares is None:
+            return NodeMetrics(cpu_pct=0.0, iowait_pct=0.0, **extras)
 
-        idle_delta = max(idle_delta, 0)
-        iowait_delta = max(iowait_delta, 0)
-        busy_delta = max(total_delta - idle_delta - iowait_delta, 0)
+        core_busy: list[float] = []
+        for name, times in current.cores.items():
+            previous_times = previous.cores.get(name)
+            core_shares = cpu_time_shares(times, previous_times) if previous_times is not None else None
+            if core_shares is not None:
+                core_busy.append(core_shares["busy"])
+
+        if core_busy:
+            extras["core_busy_pct"] = tuple(core_busy)
+            extras["max_core_pct"] = max(core_busy)
+            extras["core_imbalance_pct"] = max(core_busy) - sum(core_busy) / len(core_busy)
 
         return NodeMetrics(
-            cpu_pct=(busy_delta / total_delta) * 100.0,
-            iowait_pct=(iowait_delta / total_delta) * 100.0,
+            cpu_pct=shares["busy"],
+            iowait_pct=shares["iowait"],
+            steal_pct=shares["steal"],
+            irq_pct=shares["irq"],
+            softirq_pct=shares["softirq"],
+            **extras,
         )
 
 
+def node_payload(metrics: NodeMetrics) -> dict[str, Any]:
+    payload: dict[str, Any] = {
+        "cpu_pct": round(metrics.cpu_pct, 3),
+        "iowait_pct": round(metrics.iowait_pct, 3),
+        "steal_pct": round(metrics.steal_pct, 3),
+        "irq_pct": round(metrics.irq_pct, 3),
+        "softirq_pct": round(metrics.softirq_pct, 3),
+    }
+
+    if metrics.core_busy_pct:
+        payload["cores_busy_pct"] = [round(value, 3) for value in metrics.core_busy_pct]
+        payload["max_core_pct"] = round(metrics.max_core_pct, 3)
+        payload["core_imbalance_pct"] = round(metrics.core_imbalance_pct, 3)
+
+    for name in (
+        "load1",
+        "load5",
+        "load15",
+        "cpu_pressure_some_pct",
+        "io_pressure_some_pct",
+        "io_pressure_full_pct",
+        "memory_pressure_some_pct",
+        "memory_pressure_full_pct",
+    ):
+        value = getattr(metrics, name)
+        if value is not None:
+            payload[name] = round(value, 3)
+
+    return payload
+
+
 def encode_varint(value: int) -> bytes:
     output = bytearray()
     # Keep in unsigned 32-bit representation for protocol compatibility.
@@ -547,35 +1661,95 @@ def encode_varint(value: int) -> bytes:
     return bytes(output)
 
 
-def decode_varint(sock: socket.socket) -> int:
-    num_read = 0
-    result = 0
-    while True:
-        raw = sock.recv(1)
-        if not raw:
-            raise ConnectionError("unexpected EOF while reading varint")
+STATUS_READ_CHUNK_BYTES = 65536
+STATUS_MAX_PACKET_BYTES = 2 * 1024 * 1024
 
-        value = raw[0]
-        result |= (value & 0x7F) << (7 * num_read)
-        num_read += 1
+# Matches players.online inside a (possibly partial) status JSON body. The
+# trailing delimiter guards against digits cut off at a chunk boundary, and
+# [^{}] keeps the match inside the players object.
+PLAYERS_ONLINE_PATTERN = re.compile(rb'"players"\s*:\s*\{[^{}]*?"online"\s*:\s*(\d+)\s*[,}]')
 
-        if num_read > 5:
-            raise ValueError("varint too long")
+_status_buffers = threading.local()
 
-        if (value & 0x80) == 0:
-            break
 
-    return result
+def status_read_buffer() -> bytearray:
+    buffer = getattr(_status_buffers, "buffer", None)
+    if buffer is None:
+        buffer = bytearray(STATUS_READ_CHUNK_BYTES)
+        _status_buffers.buffer = buffer
+    return buffer
 
 
-def recv_exact(sock: socket.socket, size: int) -> bytes:
-    data = bytearray()
-    while len(data) < size:
-        chunk = sock.recv(size - len(data))
-        if not chunk:
-            raise ConnectionError("unexpected EOF while reading packet body")
-        data.extend(chunk)
-    return bytes(data)
+class StatusPacketReader:
+    # Reads Minecraft protocol frames from a socket through one reusable
+    # buffer: large recv_into calls, varints decoded from memory.
+    def __init__(self, sock: socket.socket, buffer: bytearray, deadline: float) -> None:
+        self._sock = sock
+        self._buffer = buffer
+        self._start = 0
+        self._end = 0
+        self._deadline = deadline
+
+    def _fill(self) -> None:
+        if self._end == len(self._buffer):
+            if self._start > 0:
+                pending = self._end - self._start
+                self._buffer[:pending] = self._buffer[self._start:self._end]
+                self._start, self._end = 0, pending
+            elif len(self._buffer) < STATUS_MAX_PACKET_BYTES:
+                self._buffer.extend(bytes(min(len(self._buffer), STATUS_MAX_PACKET_BYTES - len(self._buffer))))
+            else:
+                raise ValueError("status packet too large")
+
+        remaining = self._deadline - time.monotonic()
+        if remaining <= 0:
+            raise TimeoutError("status ping deadline exceeded")
+        self._sock.settimeout(remaining)
+
+        with memoryview(self._buffer) as view:
+            received = self._sock.recv_into(view[self._end:])
+        if received == 0:
+            raise ConnectionError("unexpected EOF while reading status response")
+        self._end += received
+
+    def read_varint(self) -> int:
+        result = 0
+        shift = 0
+        while True:
+            if self._start == self._end:
+                self._fill()
+
+            value = self._buffer[self._start]
+            self._start += 1
+            result |= (value & 0x7F) << shift
+            shift += 7
+
+            if (value & 0x80) == 0:
+                return result
+            if shift >= 35:
+                raise ValueError("varint too long")
+
+    def read_players_online(self, size: int) -> Optional[int]:
+        if size > STATUS_MAX_PACKET_BYTES:
+            raise ValueError("status packet too large")
+
+        # Scan the body as it arrives and stop as soon as players.online is
+        # known, so large MOTD/favicon payloads are neither read nor parsed.
+        while True:
+            available = min(self._end - self._start, size)
+            match = PLAYERS_ONLINE_PATTERN.search(self._buffer, self._start, self._start + available)
+            if match is not None:
+                return int(match.group(1))
+            if available == size:
+                break
+            self._fill()
+
+        payload = json.loads(bytes(self._buffer[self._start:self._start + size]).decode("utf-8"))
+        self._start += size
+        players = payload.get("players", {}).get("online")
+        if isinstance(players, int) and players >= 0:
+            return players
+        return None
 
 
 def encode_mc_string(value: str) -> bytes:
@@ -584,10 +1758,9 @@ def encode_mc_string(value: str) -> bytes:
 
 
 def minecraft_players_online(host: str, port: int, timeout_sec: float) -> Optional[int]:
+    deadline = time.monotonic() + timeout_sec
     try:
         with socket.create_connection((host, port), timeout=timeout_sec) as sock:
-            sock.settimeout(timeout_sec)
-
             # Handshake packet (state: status)
             handshake_payload = b"".join(
                 [
@@ -598,199 +1771,2294 @@ def minecraft_players_online(host: str, port: int, timeout_sec: float) -> Option
                     encode_varint(0x01),        # next state: status
                 ]
             )
-            sock.sendall(encode_varint(len(handshake_payload)) + handshake_payload)
-
             # Status request packet
             request_payload = encode_varint(0x00)
-            sock.sendall(encode_varint(len(request_payload)) + request_payload)
+            sock.sendall(
+                encode_varint(len(handshake_payload))
+                + handshake_payload
+                + encode_varint(len(request_payload))
+                + request_payload
+            )
 
             # Read response packet
-            _packet_length = decode_varint(sock)
-            packet_id = decode_varint(sock)
+            reader = StatusPacketReader(sock, status_read_buffer(), deadline)
+            _packet_length = reader.read_varint()
+            packet_id = reader.read_varint()
             if packet_id != 0x00:
                 return None
 
-            json_length = decode_varint(sock)
-            raw_json = recv_exact(sock, json_length)
-            payload = json.loads(raw_json.decode("utf-8"))
-            players = payload.get("players", {}).get("online")
-            if isinstance(players, int) and players >= 0:
-                return players
-            return None
+            json_length = reader.read_varint()
+            return reader.read_players_online(json_length)
     except Exception:  # noqa: BLE001
         return None
 
 
-def sample_server_metrics(
+QUERY_MAGIC = b"\xfe\xfd"
+QUERY_TYPE_HANDSHAKE = 0x09
+QUERY_TYPE_STAT = 0x00
+
+
+def minecraft_query_players_online(host: str, port: int, timeout_sec: float) -> Optional[int]:
+    # GameSpy4 query (enable-query=true in server.properties), basic stat.
+    # Assumes query.port is the allocated game port, as it is by default.
+    deadline = time.monotonic() + timeout_sec
+    session_id = struct.pack(">I", random.getrandbits(32) & 0x0F0F0F0F)
+    try:
+        family, _, _, _, address = socket.getaddrinfo(host, port, type=socket.SOCK_DGRAM)[0]
+        with socket.socket(family, socket.SOCK_DGRAM) as sock:
+            sock.connect(address)
+
+            sock.settimeout(max(deadline - time.monotonic(), 0.001))
+            sock.send(QUERY_MAGIC + bytes([QUERY_TYPE_HANDSHAKE]) + session_id)
+            response = sock.recv(2048)
+            if response[:5] != bytes([QUERY_TYPE_HANDSHAKE]) + session_id:
+                return None
+            token = int(response[5:].split(b"\0", 1)[0]) & 0xFFFFFFFF
+
+            sock.settimeout(max(deadline - time.monotonic(), 0.001))
+            sock.send(QUERY_MAGIC + bytes([QUERY_TYPE_STAT]) + session_id + struct.pack(">I", token))
+            response = sock.recv(4096)
+            if response[:5] != bytes([QUERY_TYPE_STAT]) + session_id:
+                return None
+
+            # motd, gametype, map, numplayers, maxplayers, ...
+            return int(response[5:].split(b"\0", 4)[3])
+    except Exception:  # noqa: BLE001
+        return None
+
+
+# Network probes, tried in AGENT_PLAYER_PROBES order on the worker pool;
+# each takes (host, port, timeout_sec) and returns None when it cannot tell.
+PLAYER_PROBES: dict[str, Callable[[str, int, float], Optional[int]]] = {
+    "query": minecraft_query_players_online,
+    "status": minecraft_players_online,
+}
+
+
+class PassiveConnectionCounter:
+    # Counts ESTABLISHED connections to a server's port inside the container's
+    # own network namespace, from /proc/<pid>/net/tcp and tcp6 of the first
+    # process in its cgroup.procs. Docker DNATs player traffic straight into
+    # the container, so it never shows up in the host's tables. A port with no
+    # listener in the container, or a container whose processes are not
+    # visible (the agent needs the host PID namespace), reports None so the
+    # next probe is used.
+    TCP_TABLES = ("net/tcp", "net/tcp6")
+    TCP_ESTABLISHED = "01"
+    TCP_LISTEN = "0A"
+
+    def __init__(self, reader: PseudoFileReader) -> None:
+        self.reader = reader
+
+    def players_online(self, cgroup_path: str, port: int) -> Optional[int]:
+        pid = self._first_pid(cgroup_path)
+        if pid is None:
+            return None
+
+        established = 0
+        listening = False
+        for table in self.TCP_TABLES:
+            # Unlike cgroup files these are multi-record seq files: a single
+            # pread returns at most a page of sockets, so read to EOF. They
+            # are not cached either, since an open table stays bound to the
+            # namespace it was opened in and the pid may be reused.
+            contents = read_file(f"/proc/{pid}/{table}")
+            if contents is None:
+                continue
+            for line in contents.splitlines()[1:]:
+                parts = line.split(None, 4)
+                if len(parts) < 4 or int(parts[1].rpartition(":")[2], 16) != port:
+                    continue
+                if parts[3] == self.TCP_ESTABLISHED:
+                    established += 1
+                elif parts[3] == self.TCP_LISTEN:
+                    listening = True
+
+        return established if listening else None
+
+    def _first_pid(self, cgroup_path: str) -> Optional[int]:
+        length = self.reader.read(os.path.join(cgroup_path, "cgroup.procs"))
+        if length < 0:
+            return None
+        for value in bytes(self.reader.buffer[:length]).split():
+            # 0 stands for a process outside the agent's PID namespace.
+            if value.isdigit() and int(value) > 0:
+                return int(value)
+        return None
+
+
+class PlayerProbeEngine:
+    # Runs player probes on a bounded worker pool so a hung server never
+    # delays cgroup sampling; results are folded back in on the next harvest.
+    # The passive counter is answered inline; network probes fall back in
+    # order, and a probe that fails for a server is skipped there for a while.
+    PROBE_RETRY_SEC = 600.0
+
+    def __init__(self, config: AgentConfig, reader: Optional[PseudoFileReader] = None) -> None:
+        self.config = config
+        self._executor = ThreadPoolExecutor(
+            max_workers=config.minecraft_ping_concurrency,
+            thread_name_prefix="mc-probe",
+        )
+        self._in_flight: dict[str, tuple[Future[Optional[int]], float]] = {}
+        self._ready: dict[str, int] = {}
+        self._skip_until: dict[tuple[str, str], float] = {}
+        self._lock = threading.Lock()
+        self._probes = [name for name in config.player_probes if name in PLAYER_PROBES]
+        self._passive: Optional[PassiveConnectionCounter] = None
+        if "passive" in config.player_probes and reader is not None:
+            self._passive = PassiveConnectionCounter(reader)
+        # Filled once here; worker threads only observe into the histograms.
+        self.probe_latency = {name: LatencyHistogram() for name in config.player_probes}
+
+    def submit(
+        self,
+        server_id: str,
+        host: str,
+        port: int,
+        now_monotonic: float,
+        cgroup_path: Optional[str] = None,
+    ) -> bool:
+        if server_id in self._in_flight:
+            return False
+
+        if self._passive is not None and cgroup_path is not None:
+            started = time.perf_counter()
+            players = self._passive.players_online(cgroup_path, port)
+            self.probe_latency["passive"].observe(time.perf_counter() - started)
+            if players is not None:
+                self._ready[server_id] = players
+                return True
+
+        if not self._probes:
+            return True
+
+        future = self._executor.submit(self._probe, server_id, host, port)
+        deadline = now_monotonic + max(self.config.minecraft_ping_deadline_sec, self.config.minecraft_ping_timeout_sec)
+        self._in_flight[server_id] = (future, deadline)
+        return True
+
+    def _probe(self, server_id: str, host: str, port: int) -> Optional[int]:
+        # Runs on a worker thread. The last probe is never skipped.
+        with self._lock:
+            now_monotonic = time.monotonic()
+            probes = [name for name in self._probes if self._skip_until.get((server_id, name), 0.0) <= now_monotonic]
+
+        for name in probes:
+            started = time.perf_counter()
+            players = PLAYER_PROBES[name](host, port, self.config.minecraft_ping_timeout_sec)
+            self.probe_latency[name].observe(time.perf_counter() - started)
+            with self._lock:
+                if players is not None:
+                    self._skip_until.pop((server_id, name), None)
+                    return players
+                if name != self._probes[-1]:
+                    self._skip_until[(server_id, name)] = time.monotonic() + self.PROBE_RETRY_SEC
+        return None
+
+    def harvest(self, server_states: dict[str, ServerRuntimeState], now_monotonic: float) -> None:
+        expired = 0
+
+        for server_id, players in self._ready.items():
+            state = server_states.get(server_id)
+            if state is not None:
+                state.players_online = players
+        self._ready.clear()
+
+        with self._lock:
+            for key, skip_until in list(self._skip_until.items()):
+                if skip_until <= now_monotonic:
+                    del self._skip_until[key]
+
+        for server_id, (future, deadline) in list(self._in_flight.items()):
+            if future.done():
+                del self._in_flight[server_id]
+                state = server_states.get(server_id)
+                if state is None or future.cancelled():
+                    continue
+
+                players = future.result()
+                if players is not None or state.players_online is None:
+                    state.players_online = players
+            elif now_monotonic >= deadline:
+                # Queued probes are dropped; a running one is bounded by its
+                # socket timeout and its late result is ignored.
+                future.cancel()
+                del self._in_flight[server_id]
+                expired += 1
+
+        if expired:
+            log(f"{expired} minecraft status probes exceeded deadline")
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+@dataclass(frozen=True)
+class ServerMetrics:
+    cpu_pct: float
+    io_write_bytes_per_s: float
+    cpu_pressure_some_pct: Optional[float] = None
+    cpu_pressure_full_pct: Optional[float] = None
+    io_pressure_some_pct: Optional[float] = None
+    io_pressure_full_pct: Optional[float] = None
+    memory_pressure_some_pct: Optional[float] = None
+    memory_pressure_full_pct: Optional[float] = None
+    memory_current_bytes: Optional[int] = None
+    memory_anon_bytes: Optional[int] = None
+    memory_file_bytes: Optional[int] = None
+    memory_major_faults_per_s: Optional[float] = None
+    cpu_quota_pct: Optional[float] = None
+    cpu_quota_utilisation_pct: Optional[float] = None
+    cpu_throttled_periods_pct: Optional[float] = None
+    cpu_throttled_pct: Optional[float] = None
+    cpu_pct_min: Optional[float] = None
+    cpu_pct_max: Optional[float] = None
+    cpu_pct_p95: Optional[float] = None
+    io_write_bytes_per_s_min: Optional[float] = None
+    io_write_bytes_per_s_max: Optional[float] = None
+    io_write_bytes_per_s_p95: Optional[float] = None
+
+
+EMPTY_SERVER_METRICS = ServerMetrics(cpu_pct=0.0, io_write_bytes_per_s=0.0)
+
+# Cumulative counters turned into ServerMetrics fields: (counter, field, scale).
+# PSI totals are stall usec, so usec/sec * 100 gives percent of wall time.
+SERVER_COUNTER_RATES = (
+    ("cpu_pressure_some_usec", "cpu_pressure_some_pct", 1e-4),
+    ("cpu_pressure_full_usec", "cpu_pressure_full_pct", 1e-4),
+    ("io_pressure_some_usec", "io_pressure_some_pct", 1e-4),
+    ("io_pressure_full_usec", "io_pressure_full_pct", 1e-4),
+    ("memory_pressure_some_usec", "memory_pressure_some_pct", 1e-4),
+    ("memory_pressure_full_usec", "memory_pressure_full_pct", 1e-4),
+    ("memory_major_faults", "memory_major_faults_per_s", 1.0),
+    ("cpu_throttled_usec", "cpu_throttled_pct", 1e-4),
+)
+
+
+@dataclass
+class ServerReading:
+    cpu_usage_usec: int
+    write_bytes: int
+    cpu_quota_pct: Optional[float] = None
+    counters: dict[str, int] = field(default_factory=dict)
+    gauges: dict[str, Any] = field(default_factory=dict)
+
+
+def read_server_counters(
     server: DiscoveredServer,
-    state: ServerRuntimeState,
     resolver: CgroupResolver,
-    now_monotonic: float,
-) -> tuple[float, float]:
+    reader: PseudoFileReader,
+    extended: bool = True,
+    contention_metrics: bool = False,
+) -> Optional[ServerReading]:
     cgroup_path = resolver.resolve(server.container_id)
     if cgroup_path is None:
-        return 0.0, 0.0
+        return None
 
-    cpu_usage_usec = read_cgroup_cpu_usage_usec(cgroup_path)
-    write_bytes = read_cgroup_write_bytes(cgroup_path)
+    counters: Optional[dict[str, int]] = {} if extended else None
+    cpu_usage_usec = read_cgroup_cpu_usage_usec(reader, cgroup_path, counters)
+    write_bytes = read_cgroup_write_bytes(reader, resolver.controller_path(cgroup_path, "blkio"))
     if cpu_usage_usec is None or write_bytes is None:
-        return 0.0, 0.0
+        # The cached cgroup path may be gone; re-resolve on the next sample.
+        resolver.invalidate(server.container_id)
+        return None
 
-    cpu_pct = 0.0
-    io_write_bytes_per_s = 0.0
+    reading = ServerReading(cpu_usage_usec=cpu_usage_usec, write_bytes=write_bytes)
+    if counters is None:
+        return reading
 
-    if (
-        state.last_sample_monotonic is not None
-        and state.last_cpu_usage_usec is not None
-        and state.last_write_bytes is not None
-    ):
-        elapsed = now_monotonic - state.last_sample_monotonic
-        if elapsed > 0:
-            cpu_delta = max(cpu_usage_usec - state.last_cpu_usage_usec, 0)
-            io_delta = max(write_bytes - state.last_write_bytes, 0)
+    reading.counters = counters
+    reading.cpu_quota_pct = read_cgroup_cpu_quota_pct(reader, cgroup_path)
+    if reading.cpu_quota_pct is not None:
+        reading.gauges["cpu_quota_pct"] = reading.cpu_quota_pct
+    if contention_metrics:
+        for resource in ("cpu", "io", "memory"):
+            read_cgroup_pressure(reader, cgroup_path, resource, counters)
+        read_cgroup_memory(reader, resolver.controller_path(cgroup_path, "memory"), counters, reading.gauges)
+
+    return reading
+
+
+def record_cpu_io(state: ServerRuntimeState, cpu_pct: Optional[float], io_write_bytes_per_s: Optional[float]) -> None:
+    if cpu_pct is None or io_write_bytes_per_s is None:
+        return
+    if state.cpu_window is not None and state.io_window is not None:
+        state.cpu_window.add(cpu_pct)
+        state.io_window.add(io_write_bytes_per_s)
+
+
+def sample_servers(
+    batch: list[tuple[DiscoveredServer, ServerRuntimeState]],
+    store: ServerCounterStore,
+    resolver: CgroupResolver,
+    reader: PseudoFileReader,
+    now_monotonic: float,
+    contention_metrics: bool = False,
+) -> list[ServerMetrics]:
+    # Reads every server's counters first, then derives all cpu/io rates in
+    # one store.update pass.
+    readings = [
+        read_server_counters(server, resolver, reader, contention_metrics=contention_metrics)
+        for server, _ in batch
+    ]
+    present = [index for index, reading in enumerate(readings) if reading is not None]
+    cpu_pcts, io_rates = store.update(
+        [batch[index][1].slot for index in present],
+        [readings[index].cpu_usage_usec for index in present],
+        [readings[index].write_bytes for index in present],
+        now_monotonic,
+    )
+
+    metrics = [EMPTY_SERVER_METRICS] * len(batch)
+    for index, cpu_pct, io_write_bytes_per_s in zip(present, cpu_pcts, io_rates):
+        state = batch[index][1]
+        record_cpu_io(state, cpu_pct, io_write_bytes_per_s)
+        metrics[index] = server_metrics_from_reading(state, readings[index], cpu_pct, io_write_bytes_per_s, now_monotonic)
+
+    return metrics
 
-            cpu_pct = (cpu_delta / (elapsed * 1_000_000.0)) * 100.0
-            io_write_bytes_per_s = io_delta / elapsed
 
-    state.last_cpu_usage_usec = cpu_usage_usec
-    state.last_write_bytes = write_bytes
-    state.last_sample_monotonic = now_monotonic
+def server_metrics_from_reading(
+    state: ServerRuntimeState,
+    reading: ServerReading,
+    cpu_pct: Optional[float],
+    io_write_bytes_per_s: Optional[float],
+    now_monotonic: float,
+) -> ServerMetrics:
+    counters = reading.counters
+    rates: dict[str, float] = {}
+
+    # Extended counters keep their own baseline time, so fast cpu/io-only
+    # samples in between do not distort these rates.
+    if state.last_counters_monotonic is not None and now_monotonic > state.last_counters_monotonic:
+        elapsed = now_monotonic - state.last_counters_monotonic
+
+        for counter, metric, scale in SERVER_COUNTER_RATES:
+            if counter in counters and counter in state.last_counters:
+                delta = max(counters[counter] - state.last_counters[counter], 0)
+                rates[metric] = (delta / elapsed) * scale
+
+        periods_delta = counters.get("cpu_nr_periods", 0) - state.last_counters.get("cpu_nr_periods", 0)
+        throttled_delta = counters.get("cpu_nr_throttled", 0) - state.last_counters.get("cpu_nr_throttled", 0)
+        if "cpu_nr_throttled" in state.last_counters and periods_delta > 0:
+            rates["cpu_throttled_periods_pct"] = max(throttled_delta, 0) / periods_delta * 100.0
+
+    if reading.cpu_quota_pct and cpu_pct is not None:
+        rates["cpu_quota_utilisation_pct"] = cpu_pct / reading.cpu_quota_pct * 100.0
+
+    state.last_counters = counters
+    state.last_counters_monotonic = now_monotonic
+
+    return ServerMetrics(
+        cpu_pct=cpu_pct or 0.0,
+        io_write_bytes_per_s=io_write_bytes_per_s or 0.0,
+        **rates,
+        **reading.gauges,
+    )
+
+
+def sample_servers_cpu_io(
+    batch: list[tuple[DiscoveredServer, ServerRuntimeState]],
+    store: ServerCounterStore,
+    resolver: CgroupResolver,
+    reader: PseudoFileReader,
+    now_monotonic: float,
+) -> None:
+    # Cheap between-publish sample: only usage_usec and wbytes, recorded into
+    # the servers' windows.
+    present: list[tuple[ServerRuntimeState, ServerReading]] = []
+    for server, state in batch:
+        reading = read_server_counters(server, resolver, reader, extended=False)
+        if reading is not None:
+            present.append((state, reading))
+
+    cpu_pcts, io_rates = store.update(
+        [state.slot for state, _ in present],
+        [reading.cpu_usage_usec for _, reading in present],
+        [reading.write_bytes for _, reading in present],
+        now_monotonic,
+    )
+    for (state, _), cpu_pct, io_write_bytes_per_s in zip(present, cpu_pcts, io_rates):
+        record_cpu_io(state, cpu_pct, io_write_bytes_per_s)
+
+
+def summarize_windows(state: ServerRuntimeState, metrics: ServerMetrics) -> ServerMetrics:
+    # Replaces the instantaneous cpu/io values with the window mean and adds
+    # min/max/p95, then starts a new window.
+    if state.cpu_window is None or state.io_window is None:
+        return metrics
+
+    cpu_summary = state.cpu_window.summary()
+    io_summary = state.io_window.summary()
+    state.cpu_window.clear()
+    state.io_window.clear()
+    if cpu_summary is None or io_summary is None:
+        return metrics
+
+    cpu_min, cpu_max, cpu_mean, cpu_p95 = cpu_summary
+    io_min, io_max, io_mean, io_p95 = io_summary
+    utilisation = metrics.cpu_quota_utilisation_pct
+    if metrics.cpu_quota_pct:
+        utilisation = cpu_mean / metrics.cpu_quota_pct * 100.0
+
+    return replace(
+        metrics,
+        cpu_pct=cpu_mean,
+        cpu_pct_min=cpu_min,
+        cpu_pct_max=cpu_max,
+        cpu_pct_p95=cpu_p95,
+        io_write_bytes_per_s=io_mean,
+        io_write_bytes_per_s_min=io_min,
+        io_write_bytes_per_s_max=io_max,
+        io_write_bytes_per_s_p95=io_p95,
+        cpu_quota_utilisation_pct=utilisation,
+    )
+
+
+OPTIONAL_SERVER_METRIC_FIELDS = tuple(
+    metric_field.name
+    for metric_field in fields(ServerMetrics)
+    if metric_field.name not in {"cpu_pct", "io_write_bytes_per_s"}
+)
+
 
-    return cpu_pct, io_write_bytes_per_s
+def server_payload(server: DiscoveredServer, state: ServerRuntimeState, metrics: ServerMetrics) -> dict[str, Any]:
+    payload: dict[str, Any] = {
+        "server_id": server.server_id,
+        "players_online": state.players_online,
+        "cpu_pct": round(metrics.cpu_pct, 3),
+        "io_write_bytes_per_s": round(metrics.io_write_bytes_per_s, 3),
+    }
+
+    # Optional metrics are only sent when the host exposes them.
+    for name in OPTIONAL_SERVER_METRIC_FIELDS:
+        value = getattr(metrics, name)
+        if value is not None:
+            payload[name] = round(value, 3) if isinstance(value, float) else value
+
+    return payload
+
+
+class DeltaEncoder:
+    # Deadband delta encoding of the server list. Every sample gets a
+    # sequence number; keyframes carry all servers, other samples only the
+    # servers whose players changed or whose cpu/io moved past the deadband
+    # since they were last included, plus the ids of servers that went away.
+    def __init__(self, keyframe_interval: int, cpu_deadband_pct: float, io_deadband_bytes_per_s: float) -> None:
+        self.keyframe_interval = max(keyframe_interval, 1)
+        self.cpu_deadband_pct = cpu_deadband_pct
+        self.io_deadband_bytes_per_s = io_deadband_bytes_per_s
+        self.seq = 0
+        # What the orchestrator is assumed to hold per server; only valid
+        # while every encoded sample is delivered, see force_keyframe().
+        self._sent: dict[str, dict[str, Any]] = {}
+        self._keyframe_due = False
+
+    def _changed(self, server: dict[str, Any]) -> bool:
+        previous = self._sent.get(server["server_id"])
+        if previous is None:
+            return True
+        return (
+            server["players_online"] != previous["players_online"]
+            or abs(server["cpu_pct"] - previous["cpu_pct"]) > self.cpu_deadband_pct
+            or abs(server["io_write_bytes_per_s"] - previous["io_write_bytes_per_s"]) > self.io_deadband_bytes_per_s
+        )
+
+    def force_keyframe(self) -> None:
+        # A sample was dropped or failed to deliver, so the deadband baseline
+        # is wrong; the next sample carries every server again.
+        self._keyframe_due = True
+
+    def encode(self, payload: dict[str, Any]) -> dict[str, Any]:
+        keyframe = self.seq % self.keyframe_interval == 0
+        if self._keyframe_due:
+            self._keyframe_due = False
+            keyframe = True
+        self.seq += 1
+        servers: list[dict[str, Any]] = payload["servers"]
+        current_ids = {server["server_id"] for server in servers}
+        removed = [server_id for server_id in self._sent if server_id not in current_ids]
+        for server_id in removed:
+            del self._sent[server_id]
+
+        if not keyframe:
+            servers = [server for server in servers if self._changed(server)]
+        for server in servers:
+            self._sent[server["server_id"]] = server
+
+        encoded = dict(payload, seq=self.seq, keyframe=keyframe, servers=servers)
+        if not keyframe:
+            encoded["removed_servers"] = removed
+        return encoded
+
+
+@dataclass(frozen=True)
+class PublishResult:
+    sent: bool
+    retryable: bool
+    # Backpressure from the orchestrator: Retry-After of a 429/503 and the
+    # send_interval_sec it asked for in the response body.
+    retry_after_sec: Optional[float] = None
+    send_interval_sec: Optional[float] = None
+
+
+def parse_retry_after(value: Optional[str], now_epoch: float) -> Optional[float]:
+    # Retry-After is either delay-seconds or an HTTP-date.
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(retry_at.timestamp() - now_epoch, 0.0)
+
+
+@dataclass
+class SpoolSegment:
+    sequence: int
+    path: str
+    size: int
+
+
+class TelemetrySpool:
+    # Append-only segment files of newline-delimited JSON payloads that could
+    # not be sent. Oldest segments are evicted past max_bytes; a cursor file
+    # records how far replay has got (delivery is at-least-once).
+    SEGMENT_SUFFIX = ".spool"
+    CURSOR_FILENAME = "cursor.json"
+
+    def __init__(self, directory: str, max_bytes: int, segment_bytes: int, fsync_interval_sec: float) -> None:
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.segment_bytes = segment_bytes
+        self.fsync_interval_sec = fsync_interval_sec
+
+        os.makedirs(directory, exist_ok=True)
+        self._segments = self._load_segments()
+        self._handle: Optional[Any] = None
+        self._dirty = False
+        self._last_fsync_monotonic = time.monotonic()
+        self._cursor = self._load_cursor()
+
+    def append(self, payload: dict[str, Any]) -> None:
+        record = json.dumps(payload, separators=(",", ":")).encode("utf-8") + b"\n"
+
+        if self._handle is None or self._segments[-1].size + len(record) > self.segment_bytes:
+            self._rotate()
+
+        assert self._handle is not None
+        self._handle.write(record)
+        self._segments[-1].size += len(record)
+        self._dirty = True
+
+        self._evict()
+        self.sync(force=False)
+
+    def has_pending(self) -> bool:
+        sequence, offset = self._cursor
+        return any(
+            segment.size > (offset if segment.sequence == sequence else 0)
+            for segment in self._segments
+            if segment.sequence >= sequence
+        )
+
+    def drain(self, send: Callable[[list[dict[str, Any]]], PublishResult], max_items: int, chunk_size: int) -> int:
+        replayed = 0
+        position = self._cursor
+        records = self._read(max_items)
+        chunk: list[dict[str, Any]] = []
+
+        for index, (payload, next_position) in enumerate(records):
+            if payload is not None:
+                chunk.append(payload)
+            if len(chunk) < chunk_size and index < len(records) - 1:
+                continue
+
+            if chunk:
+                result = send(chunk)
+                if not result.sent and result.retryable:
+                    break
+                if result.sent:
+                    replayed += len(chunk)
+                chunk = []
+            position = next_position
+
+        if position != self._cursor:
+            self._advance(position)
+        return replayed
+
+    def sync(self, force: bool) -> None:
+        if self._handle is None or not self._dirty:
+            return
+
+        now_monotonic = time.monotonic()
+        if not force and now_monotonic - self._last_fsync_monotonic < self.fsync_interval_sec:
+            return
+
+        self._handle.flush()
+        os.fsync(self._handle.fileno())
+        self._dirty = False
+        self._last_fsync_monotonic = now_monotonic
+
+    def close(self) -> None:
+        self.sync(force=True)
+        if self._handle is not None:
+            self._handle.close()
+            self._handle = None
+
+    def _read(self, max_items: int) -> list[tuple[Optional[dict[str, Any]], tuple[int, int]]]:
+        if self._handle is not None:
+            self._handle.flush()
+
+        sequence, offset = self._cursor
+        records: list[tuple[Optional[dict[str, Any]], tuple[int, int]]] = []
+
+        for segment in self._segments:
+            if segment.sequence < sequence:
+                continue
+
+            position = offset if segment.sequence == sequence else 0
+            try:
+                with open(segment.path, "rb") as handle:
+                    handle.seek(position)
+                    for line in handle:
+                        position += len(line)
+                        try:
+                            # A torn write left by a crash fails to parse and
+                            # is skipped along with any other corrupt record.
+                            payload = json.loads(line)
+                        except ValueError:
+                            payload = None
+                        records.append((payload, (segment.sequence, position)))
+                        if len(records) >= max_items:
+                            return records
+            except OSError as exc:
+                log(f"telemetry spool read failed ({segment.path}): {exc}")
+                return records
+
+        return records
+
+    def _advance(self, position: tuple[int, int]) -> None:
+        sequence, offset = position
+        active_sequence = self._segments[-1].sequence if self._handle is not None else None
+
+        for segment in list(self._segments):
+            consumed = segment.sequence < sequence or (segment.sequence == sequence and offset >= segment.size)
+            if consumed and segment.sequence != active_sequence:
+                self._remove_segment(segment)
+
+        self._cursor = position
+        self._write_cursor()
+
+    def _rotate(self) -> None:
+        if self._handle is not None:
+            self.sync(force=True)
+            self._handle.close()
+
+        # Never reuse a sequence at or below the replay cursor, even after
+        # every segment has been drained and removed.
+        sequence = max([segment.sequence for segment in self._segments] + [self._cursor[0]]) + 1
+        path = os.path.join(self.directory, f"{sequence:020d}{self.SEGMENT_SUFFIX}")
+        self._handle = open(path, "ab")
+        self._segments.append(SpoolSegment(sequence=sequence, path=path, size=0))
+
+    def _evict(self) -> None:
+        evicted = 0
+        while len(self._segments) > 1 and sum(segment.size for segment in self._segments) > self.max_bytes:
+            evicted += self._segments[0].size
+            self._remove_segment(self._segments[0])
+
+        if evicted:
+            log(f"telemetry spool full; evicted {evicted} bytes of oldest samples")
+
+    def _remove_segment(self, segment: SpoolSegment) -> None:
+        self._segments.remove(segment)
+        try:
+            os.unlink(segment.path)
+        except OSError as exc:
+            log(f"telemetry spool cleanup failed ({segment.path}): {exc}")
+
+    def _load_segments(self) -> list[SpoolSegment]:
+        segments: list[SpoolSegment] = []
+        for filename in os.listdir(self.directory):
+            stem = filename.removesuffix(self.SEGMENT_SUFFIX)
+            if stem == filename or not stem.isdigit():
+                continue
+            path = os.path.join(self.directory, filename)
+            try:
+                size = os.path.getsize(path)
+            except OSError:
+                continue
+            segments.append(SpoolSegment(sequence=int(stem), path=path, size=size))
+        return sorted(segments, key=lambda segment: segment.sequence)
+
+    def _load_cursor(self) -> tuple[int, int]:
+        raw = read_file(os.path.join(self.directory, self.CURSOR_FILENAME))
+        try:
+            data = json.loads(raw) if raw else {}
+            return int(data.get("sequence", 0)), int(data.get("offset", 0))
+        except (ValueError, TypeError, AttributeError):
+            return 0, 0
+
+    def _write_cursor(self) -> None:
+        sequence, offset = self._cursor
+        path = os.path.join(self.directory, self.CURSOR_FILENAME)
+        try:
+            with open(f"{path}.tmp", "w", encoding="utf-8") as handle:
+                json.dump({"sequence": sequence, "offset": offset}, handle)
+            os.replace(f"{path}.tmp", path)
+        except OSError as exc:
+            log(f"telemetry spool cursor write failed: {exc}")
 
 
 class OrchestratorPublisher:
-    def __init__(self, config: AgentConfig) -> None:
+    def __init__(self, config: AgentConfig, http_client: HttpClient) -> None:
         self.config = config
+        self.http_client = http_client
+        self._zstd_compressor = (
+            zstandard.ZstdCompressor(level=3)
+            if config.upload_compression == "zstd" and zstandard is not None
+            else None
+        )
+        # Self-instrumentation: JSON encoding + compression and POST
+        # latencies, uncompressed and on-the-wire body bytes.
+        self.encode_latency = LatencyHistogram()
+        self.post_latency = LatencyHistogram()
+        self.payload_bytes = 0
+        self.wire_bytes = 0
+
+    @property
+    def batching(self) -> bool:
+        return self.config.upload_batch_size > 1
+
+    def publish(self, payload: dict[str, Any]) -> PublishResult:
+        started = time.perf_counter()
+        body = json.dumps(payload).encode("utf-8")
+        self.encode_latency.observe(time.perf_counter() - started)
+        self.payload_bytes += len(body)
+        return self._post(self._telemetry_url(), body, content_encoding=None)
+
+    def publish_batch(self, payloads: list[dict[str, Any]]) -> PublishResult:
+        # Each sample keeps its own timestamp; node_id is hoisted to the
+        # envelope instead of being repeated per sample.
+        samples = [
+            {key: value for key, value in payload.items() if key != "node_id"}
+            for payload in payloads
+        ]
+        started = time.perf_counter()
+        body = json.dumps({"node_id": self.config.node_id, "samples": samples}, separators=(",", ":")).encode("utf-8")
+        self.payload_bytes += len(body)
+        body, content_encoding = self._compress(body)
+        self.encode_latency.observe(time.perf_counter() - started)
+        return self._post(f"{self._telemetry_url()}/batch", body, content_encoding=content_encoding)
+
+    def publish_samples(self, payloads: list[dict[str, Any]]) -> PublishResult:
+        if self.batching:
+            return self.publish_batch(payloads)
+
+        result = PublishResult(sent=True, retryable=False)
+        for payload in payloads:
+            result = self.publish(payload)
+            if not result.sent and result.retryable:
+                break
+        return result
+
+    def _send_interval(self, response: HttpResponse) -> Optional[float]:
+        # {"send_interval_sec": N} asks this agent to post at most every N
+        # seconds; anything else (including an empty body) lifts it.
+        try:
+            value = response.json().get("send_interval_sec")
+        except Exception:  # noqa: BLE001
+            return None
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or value <= 0:
+            return None
+        return min(float(value), self.config.send_interval_max_sec)
 
-    def publish(self, payload: dict[str, Any]) -> bool:
+    def _telemetry_url(self) -> str:
         encoded_node_id = urllib.parse.quote(self.config.node_id, safe="")
-        url = f"{self.config.orchestrator_base_url}/internal/nodes/{encoded_node_id}/telemetry"
-
+        return f"{self.config.orchestrator_base_url}/internal/nodes/{encoded_node_id}/telemetry"
+
+    def _compress(self, body: bytes) -> tuple[bytes, Optional[str]]:
+        if self._zstd_compressor is not None:
+            return self._zstd_compressor.compress(body), "zstd"
+        if self.config.upload_compression in {"gzip", "zstd"}:
+            return gzip.compress(body, compresslevel=6), "gzip"
+        return body, None
+
+    def _post(self, url: str, body: bytes, content_encoding: Optional[str]) -> PublishResult:
+        headers = {
+            "Accept": "application/json",
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {self.config.node_token}",
+        }
+        if content_encoding is not None:
+            headers["Content-Encoding"] = content_encoding
+
+        self.wire_bytes += len(body)
+        started = time.perf_counter()
         try:
-            http_json_request(
-                method="POST",
-                url=url,
-                timeout_sec=self.config.http_timeout_sec,
-                insecure_tls=self.config.insecure_tls,
-                bearer_token=self.config.node_token,
-                payload=payload,
+            response = self.http_client.request("POST", url, headers=headers, body=body)
+            self.post_latency.observe(time.perf_counter() - started)
+            return PublishResult(sent=True, retryable=False, send_interval_sec=self._send_interval(response))
+        except HttpResponseError as exc:
+            self.post_latency.observe(time.perf_counter() - started)
+            status = exc.response.status
+            message = exc.response.body.decode("utf-8", errors="replace")
+            log(f"telemetry publish HTTP {status}: {message}")
+            retry_after_sec = None
+            if status in {429, 503}:
+                retry_after_sec = parse_retry_after(exc.response.headers.get("retry-after"), time.time())
+                if retry_after_sec is not None:
+                    retry_after_sec = min(retry_after_sec, self.config.send_interval_max_sec)
+            # Other 4xx responses reject the payload itself; resending it
+            # would fail the same way.
+            return PublishResult(
+                sent=False,
+                retryable=status >= 500 or status in {401, 403, 408, 429},
+                retry_after_sec=retry_after_sec,
+                send_interval_sec=self._send_interval(exc.response),
             )
-            return True
-        except urllib.error.HTTPError as exc:
-            message = exc.read().decode("utf-8", errors="replace")
-            log(f"telemetry publish HTTP {exc.code}: {message}")
-            return False
         except Exception as exc:  # noqa: BLE001
             log(f"telemetry publish failed: {exc}")
-            return False
+            return PublishResult(sent=False, retryable=True)
 
 
-def run() -> None:
-    config = AgentConfig.from_env()
-    discoverer = WingsDiscoverer(config)
-    cgroup_resolver = CgroupResolver()
-    node_tracker = NodeMetricTracker()
-    publisher = OrchestratorPublisher(config)
+def server_is_idle(state: ServerRuntimeState, config: AgentConfig, now_monotonic: float) -> bool:
+    if state.players_online:
+        state.last_active_monotonic = now_monotonic
+    if state.last_active_monotonic is None:
+        return False
+    return now_monotonic - state.last_active_monotonic >= config.idle_after_sec
 
-    server_states: dict[str, ServerRuntimeState] = {}
-    discovered_servers: list[DiscoveredServer] = []
 
-    next_discovery_at = 0.0
-    next_send_at = 0.0
-    send_backoff_sec = 1.0
+def server_in_burst(state: ServerRuntimeState, now_monotonic: float) -> bool:
+    return now_monotonic < state.burst_until_monotonic
 
-    log(
-        "node agent started "
-        f"(node_id={config.node_id}, orchestrator={config.orchestrator_base_url}, wings={config.wings_base_url})"
-    )
 
-    while True:
+def update_server_cadence(
+    state: ServerRuntimeState,
+    metrics: ServerMetrics,
+    config: AgentConfig,
+    now_monotonic: float,
+) -> None:
+    # Decides when this server is sampled next: idle servers (low CPU, no
+    # players) drop to the idle interval, servers crossing a burst threshold
+    # get fast cpu/io sampling for burst_duration_sec.
+    if state.last_active_monotonic is None or metrics.cpu_pct >= config.idle_cpu_pct or state.players_online:
+        state.last_active_monotonic = now_monotonic
+
+    peak_cpu_pct = max(metrics.cpu_pct, metrics.cpu_pct_max or 0.0)
+    peak_io_bytes_per_s = max(metrics.io_write_bytes_per_s, metrics.io_write_bytes_per_s_max or 0.0)
+    if (config.burst_cpu_pct > 0 and peak_cpu_pct >= config.burst_cpu_pct) or (
+        config.burst_io_bytes_per_s > 0 and peak_io_bytes_per_s >= config.burst_io_bytes_per_s
+    ):
+        if not server_in_burst(state, now_monotonic):
+            state.next_fast_sample_monotonic = now_monotonic
+        state.burst_until_monotonic = now_monotonic + config.burst_duration_sec
+
+    state.next_sample_monotonic = now_monotonic
+    if server_is_idle(state, config, now_monotonic):
+        state.next_sample_monotonic = now_monotonic + config.idle_sample_interval_sec
+
+
+def fast_sample_interval(state: ServerRuntimeState, config: AgentConfig, now_monotonic: float) -> Optional[float]:
+    # Between-publish cpu/io sampling interval for one server, or None when
+    # it only gets the regular samples.
+    if config.adaptive_sampling:
+        if server_in_burst(state, now_monotonic):
+            if config.fast_sample_interval_sec > 0:
+                return min(config.burst_sample_interval_sec, config.fast_sample_interval_sec)
+            return config.burst_sample_interval_sec
+        if server_is_idle(state, config, now_monotonic):
+            return None
+    if config.fast_sample_interval_sec > 0:
+        return config.fast_sample_interval_sec
+    return None
+
+
+class HistoryRing:
+    # Fixed-size memory-mapped ring of compact binary samples: one record per
+    # node sample and per server sample, overwriting the oldest once full.
+    # Appends pack straight into the mapping and only the header's write
+    # count is updated afterwards, so a reader at worst sees one torn record.
+    MAGIC = b"NAHIST01"
+    HEADER = struct.Struct("<8sIIQ")  # magic, record size, capacity, records written
+    HEADER_BYTES = 64
+    # timestamp, kind, server id, four metric values (NaN when absent), players (-1 when unknown)
+    RECORD = struct.Struct("<dB36s3xffffi")
+    KIND_NODE = 0
+    KIND_SERVER = 1
+    NODE_FIELDS = ("cpu_pct", "iowait_pct", "steal_pct", "load1")
+    SERVER_FIELDS = ("cpu_pct", "io_write_bytes_per_s", "memory_current_bytes", "cpu_throttled_pct")
+
+    def __init__(self, path: str, max_bytes: int = 0, writable: bool = True) -> None:
+        self.path = path
+        mode = os.O_RDWR | os.O_CREAT if writable else os.O_RDONLY
+        self._fd = os.open(path, mode, 0o644)
         try:
-            now_monotonic = time.monotonic()
-            now_epoch = time.time()
+            if writable:
+                self._open_for_write(max_bytes)
+            size = os.fstat(self._fd).st_size
+            access = mmap.ACCESS_WRITE if writable else mmap.ACCESS_READ
+            self._map = mmap.mmap(self._fd, size, access=access)
+            magic, record_size, self.capacity, self._written = self.HEADER.unpack_from(self._map, 0)
+            if magic != self.MAGIC or record_size != self.RECORD.size or self.capacity <= 0:
+                raise ValueError(f"{path} is not a history file")
+        except BaseException:
+            os.close(self._fd)
+            raise
+
+    def _open_for_write(self, max_bytes: int) -> None:
+        capacity = max((max_bytes - self.HEADER_BYTES) // self.RECORD.size, 1)
+        size = self.HEADER_BYTES + capacity * self.RECORD.size
+        header = os.pread(self._fd, self.HEADER.size, 0)
+        if len(header) == self.HEADER.size and os.fstat(self._fd).st_size == size:
+            magic, record_size, existing_capacity, _ = self.HEADER.unpack(header)
+            if magic == self.MAGIC and record_size == self.RECORD.size and existing_capacity == capacity:
+                return
+
+        # New file or a different layout/size: start empty.
+        os.ftruncate(self._fd, 0)
+        os.ftruncate(self._fd, size)
+        os.pwrite(self._fd, self.HEADER.pack(self.MAGIC, self.RECORD.size, capacity, 0), 0)
+
+    def __len__(self) -> int:
+        return min(self._written, self.capacity)
+
+    def _offset(self, position: int) -> int:
+        return self.HEADER_BYTES + (position % self.capacity) * self.RECORD.size
+
+    def append(self, timestamp: float, kind: int, key: bytes, values: tuple[float, ...], players: int) -> None:
+        self.RECORD.pack_into(self._map, self._offset(self._written), timestamp, kind, key, *values, players)
+        self._written += 1
+        self.HEADER.pack_into(self._map, 0, self.MAGIC, self.RECORD.size, self.capacity, self._written)
+
+    def record_sample(
+        self,
+        timestamp: float,
+        node_metrics: NodeMetrics,
+        sampled: list[tuple[DiscoveredServer, ServerRuntimeState, ServerMetrics]],
+    ) -> None:
+        nan = math.nan
+        self.append(
+            timestamp,
+            self.KIND_NODE,
+            b"",
+            tuple(nan if getattr(node_metrics, name) is None else getattr(node_metrics, name) for name in self.NODE_FIELDS),
+            -1,
+        )
+        for server, state, metrics in sampled:
+            self.append(
+                timestamp,
+                self.KIND_SERVER,
+                server.server_id.encode("utf-8")[:36],
+                tuple(nan if getattr(metrics, name) is None else getattr(metrics, name) for name in self.SERVER_FIELDS),
+                -1 if state.players_online is None else state.players_online,
+            )
+
+    def _refresh(self) -> None:
+        # Readers follow a live writer through the shared header.
+        self._written = self.HEADER.unpack_from(self._map, 0)[3]
+
+    def _timestamp_at(self, position: int) -> float:
+        return struct.unpack_from("<d", self._map, self._offset(position))[0]
+
+    def query(
+        self,
+        since: float,
+        until: float,
+        server_id: Optional[str] = None,
+    ) -> Iterator[dict[str, Any]]:
+        # Yields records with since <= timestamp <= until, oldest first;
+        # node records when server_id is None, otherwise that server's.
+        self._refresh()
+        first = self._written - len(self)
+        low, high = first, self._written
+        while low < high:
+            middle = (low + high) // 2
+            if self._timestamp_at(middle) < since:
+                low = middle + 1
+            else:
+                high = middle
+
+        kind = self.KIND_NODE if server_id is None else self.KIND_SERVER
+        key = b"" if server_id is None else server_id.encode("utf-8")[:36]
+        names = self.NODE_FIELDS if server_id is None else self.SERVER_FIELDS
+        for position in range(low, self._written):
+            timestamp, record_kind, record_key, *values, players = self.RECORD.unpack_from(
+                self._map, self._offset(position)
+            )
+            if timestamp > until:
+                break
+            if record_kind != kind or record_key.rstrip(b"\0") != key:
+                continue
+            record: dict[str, Any] = {"timestamp": datetime.fromtimestamp(timestamp, timezone.utc).isoformat()}
+            if server_id is not None:
+                record["server_id"] = server_id
+                record["players_online"] = None if players < 0 else players
+            for name, value in zip(names, values):
+                if not math.isnan(value):
+                    record[name] = round(value, 3)
+            yield record
+
+    def flush(self) -> None:
+        self._map.flush()
+
+    def close(self) -> None:
+        self._map.close()
+        os.close(self._fd)
+
+
+def parse_history_time(value: str, now_epoch: float) -> float:
+    # "90s", "15m", "6h", "2d" back from now, or an ISO 8601 timestamp.
+    units = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+    value = value.strip()
+    if value[-1:] in units and value[:-1].replace(".", "", 1).isdigit():
+        return now_epoch - float(value[:-1]) * units[value[-1]]
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+class LocalRequestHandler(BaseHTTPRequestHandler):
+    # Read-only local endpoint; routes are registered on the server object.
+    server: "LocalHttpServer"
+
+    def do_GET(self) -> None:  # noqa: N802
+        parsed = urllib.parse.urlsplit(self.path)
+        route = self.server.routes.get(parsed.path)
+        if route is None:
+            self._respond(404, "text/plain; charset=utf-8", b"not found\n")
+            return
+
+        params = {key: values[-1] for key, values in urllib.parse.parse_qs(parsed.query).items()}
+        try:
+            content_type, body = route(params)
+        except ValueError as exc:
+            self._respond(400, "text/plain; charset=utf-8", f"{exc}\n".encode("utf-8"))
+            return
+        self._respond(200, content_type, body)
+
+    def _respond(self, status: int, content_type: str, body: bytes) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args: Any) -> None:  # noqa: A002
+        pass
+
+
+class LocalHttpServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address: str) -> None:
+        host, _, port = address.rpartition(":")
+        super().__init__((host.strip("[]") or "127.0.0.1", int(port)), LocalRequestHandler)
+        self.routes: dict[str, Callable[[dict[str, str]], tuple[str, bytes]]] = {}
+
+    def start(self) -> None:
+        threading.Thread(target=self.serve_forever, name="local-http", daemon=True).start()
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+
+
+def history_route(history: HistoryRing) -> Callable[[dict[str, str]], tuple[str, bytes]]:
+    # GET /history?server=<id>&since=1h&until=<iso> as NDJSON; node samples
+    # when no server is given.
+    def handle(params: dict[str, str]) -> tuple[str, bytes]:
+        now_epoch = time.time()
+        since = parse_history_time(params.get("since", "1h"), now_epoch)
+        until = parse_history_time(params["until"], now_epoch) if "until" in params else now_epoch
+        lines = [json.dumps(record) for record in history.query(since, until, params.get("server"))]
+        return "application/x-ndjson", "".join(f"{line}\n" for line in lines).encode("utf-8")
+
+    return handle
+
+
+OPENMETRICS_CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+
+
+def openmetrics_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
 
-            if now_monotonic >= next_discovery_at:
-                discovered_servers = discoverer.discover_servers()
-                known_ids = {server.server_id for server in discovered_servers}
-                server_states = {
-                    server_id: state
+
+def render_openmetrics(
+    timestamp: float,
+    node_metrics: NodeMetrics,
+    sampled: list[tuple[DiscoveredServer, ServerRuntimeState, ServerMetrics]],
+) -> bytes:
+    # Rendered once per sample by the sampling lane; /metrics serves the
+    # cached bytes, so a scrape never touches procfs or cgroupfs.
+    lines = [
+        "# TYPE node_agent_sample_timestamp_seconds gauge",
+        f"node_agent_sample_timestamp_seconds {timestamp:.3f}",
+        "# TYPE node_agent_servers gauge",
+        f"node_agent_servers {len(sampled)}",
+    ]
+
+    for item in fields(NodeMetrics):
+        value = getattr(node_metrics, item.name)
+        if value is None or value == ():
+            continue
+        name = f"node_agent_node_{item.name}"
+        lines.append(f"# TYPE {name} gauge")
+        if isinstance(value, tuple):
+            lines.extend(f'{name}{{core="{index}"}} {core_value:.3f}' for index, core_value in enumerate(value))
+        else:
+            lines.append(f"{name} {value:.3f}")
+
+    labels = [f'{{server_id="{openmetrics_label(server.server_id)}"}}' for server, _, _ in sampled]
+    lines.append("# TYPE node_agent_server_players_online gauge")
+    lines.extend(
+        f"node_agent_server_players_online{label} {state.players_online}"
+        for label, (_, state, _) in zip(labels, sampled)
+        if state.players_online is not None
+    )
+    for item in fields(ServerMetrics):
+        values = [
+            (label, getattr(metrics, item.name))
+            for label, (_, _, metrics) in zip(labels, sampled)
+            if getattr(metrics, item.name) is not None
+        ]
+        if not values:
+            continue
+        name = f"node_agent_server_{item.name}"
+        lines.append(f"# TYPE {name} gauge")
+        for label, value in values:
+            lines.append(f"{name}{label} {value:.3f}" if isinstance(value, float) else f"{name}{label} {value}")
+
+    lines.append("# EOF\n")
+    return "\n".join(lines).encode("utf-8")
+
+
+def history_cli(argv: list[str]) -> int:
+    parser = argparse.ArgumentParser(prog="main.py history", description="Dump locally recorded samples as NDJSON.")
+    parser.add_argument("--file", default=os.getenv("AGENT_HISTORY_FILE", "").strip() or None)
+    parser.add_argument("--server", help="server id; node samples when omitted")
+    parser.add_argument("--since", default="1h", help="e.g. 30m, 6h or an ISO 8601 time (default: 1h)")
+    parser.add_argument("--until", help="e.g. 10m or an ISO 8601 time (default: now)")
+    args = parser.parse_args(argv)
+    if args.file is None:
+        parser.error("--file or AGENT_HISTORY_FILE is required")
+
+    now_epoch = time.time()
+    try:
+        history = HistoryRing(args.file, writable=False)
+        since = parse_history_time(args.since, now_epoch)
+        until = parse_history_time(args.until, now_epoch) if args.until else now_epoch
+    except (OSError, ValueError) as exc:
+        print(f"history: {exc}", file=sys.stderr)
+        return 1
+
+    try:
+        for record in history.query(since, until, args.server):
+            sys.stdout.write(json.dumps(record) + "\n")
+    finally:
+        history.close()
+    return 0
+
+
+TRACE_FILE_VERSION = 1
+# Never part of a trace: secrets, and local files replay must not touch.
+TRACE_CONFIG_EXCLUDED = ("node_token", "wings_token")
+TRACE_REPLAY_DISABLED = ("state_file", "history_file", "local_http_addr", "trace_file", "spool_dir", "docker_socket")
+
+
+class TraceWriter:
+    # Capture mode: a gzip NDJSON trace of what the sampling lane saw - raw
+    # pseudo-file contents, resolved cgroup paths, and per sample tick the
+    # discovered servers and probed players - enough for replay_cli to re-run
+    # the node tracker, server sampling and payload building offline.
+    # Contents, paths, servers and players are only written when they
+    # changed; the stream is sync-flushed on every tick, so a trace cut off
+    # by a crash is readable up to the last complete tick. The passive
+    # player counter's cgroup.procs reads are left out; replay takes players
+    # from ticks.
+    SKIP_SUFFIXES = ("/cgroup.procs",)
+
+    def __init__(self, path: str, max_bytes: int, config: AgentConfig) -> None:
+        self.path = path
+        self.max_bytes = max_bytes
+        self.records = 0
+        self.stopped = False
+        self._lock = threading.Lock()
+        self._path_ids: dict[str, int] = {}
+        self._contents: dict[str, Optional[bytes]] = {}
+        self._cgroup_paths: dict[str, Optional[str]] = {}
+        self._servers: Optional[tuple[DiscoveredServer, ...]] = None
+        self._players: dict[str, Optional[int]] = {}
+        self._raw = open(path, "wb")
+        self._stream = gzip.GzipFile(fileobj=self._raw, mode="wb", compresslevel=6)
+        self._write(
+            {
+                "k": "header",
+                "version": TRACE_FILE_VERSION,
+                "boot_id": read_boot_id(),
+                "config": {
+                    item.name: getattr(config, item.name)
+                    for item in fields(config)
+                    if item.name not in TRACE_CONFIG_EXCLUDED
+                },
+                "unified": os.path.exists(os.path.join(config.cgroup_root, "cgroup.controllers")),
+            }
+        )
+
+    def _write(self, record: dict[str, Any]) -> None:
+        self._stream.write(json.dumps(record, separators=(",", ":")).encode("utf-8") + b"\n")
+        self.records += 1
+
+    def record_tick(
+        self,
+        job: str,
+        now_monotonic: float,
+        now_epoch: float,
+        servers: Optional[tuple[DiscoveredServer, ...]] = None,
+        server_states: Optional[dict[str, ServerRuntimeState]] = None,
+    ) -> None:
+        with self._lock:
+            if self.stopped:
+                return
+            self._stream.flush()
+            if self._raw.tell() >= self.max_bytes:
+                log(f"sampling trace reached {self.max_bytes} bytes; recording stopped")
+                self._close()
+                return
+
+            record: dict[str, Any] = {"k": "tick", "j": job, "t": now_monotonic, "e": now_epoch}
+            if servers is not None and servers is not self._servers:
+                self._servers = servers
+                record["s"] = [[server.server_id, server.container_id, server.allocated_port] for server in servers]
+            if server_states is not None:
+                changed = {
+                    server_id: state.players_online
                     for server_id, state in server_states.items()
-                    if server_id in known_ids
+                    if self._players.get(server_id) != state.players_online
                 }
-                for server in discovered_servers:
-                    server_states.setdefault(server.server_id, ServerRuntimeState(next_players_probe_epoch=0.0))
-
-                next_discovery_at = now_monotonic + max(config.discovery_interval_sec, 5.0)
-                log(f"discovered {len(discovered_servers)} running servers")
-
-            node_metrics = node_tracker.sample()
-            servers_payload: list[dict[str, Any]] = []
-
-            for server in discovered_servers:
-                state = server_states.setdefault(server.server_id, ServerRuntimeState(next_players_probe_epoch=0.0))
-                cpu_pct, io_write_bps = sample_server_metrics(
-                    server=server,
-                    state=state,
-                    resolver=cgroup_resolver,
-                    now_monotonic=now_monotonic,
-                )
+                if changed:
+                    self._players.update(changed)
+                    record["p"] = changed
+            self._write(record)
+
+    def record_read(self, path: str, buffer: bytearray, length: int) -> None:
+        if path.endswith(self.SKIP_SUFFIXES):
+            return
+        contents = bytes(buffer[:length]) if length >= 0 else None
+        with self._lock:
+            if self.stopped or (path in self._contents and self._contents[path] == contents):
+                return
+            self._contents[path] = contents
+            path_id = self._path_ids.get(path)
+            if path_id is None:
+                path_id = self._path_ids[path] = len(self._path_ids)
+                self._write({"k": "path", "i": path_id, "p": path})
+            # latin-1 maps every byte to one code point, so contents survive
+            # the JSON round trip exactly.
+            self._write({"k": "read", "i": path_id, "d": None if contents is None else contents.decode("latin-1")})
+
+    def record_cgroup(self, container_id: str, cgroup_path: Optional[str]) -> None:
+        with self._lock:
+            if self.stopped or (container_id in self._cgroup_paths and self._cgroup_paths[container_id] == cgroup_path):
+                return
+            self._cgroup_paths[container_id] = cgroup_path
+            self._write({"k": "cgroup", "c": container_id, "p": cgroup_path})
+
+    def _close(self) -> None:
+        # Ticks are recorded before their reads; the end record marks the
+        # last one complete.
+        self._write({"k": "end"})
+        self.stopped = True
+        self._stream.close()
+        self._raw.close()
+
+    def close(self) -> None:
+        with self._lock:
+            if not self.stopped:
+                self._close()
+
+
+class RecordingFileReader(PseudoFileReader):
+    def __init__(self, trace: TraceWriter) -> None:
+        super().__init__()
+        self.trace = trace
+
+    def read(self, path: str) -> int:
+        length = super().read(path)
+        self.trace.record_read(path, self.buffer, length)
+        return length
+
+
+class RecordingCgroupResolver(CgroupResolver):
+    def __init__(self, trace: TraceWriter, cgroup_root: str, miss_ttl_sec: float) -> None:
+        super().__init__(cgroup_root, miss_ttl_sec=miss_ttl_sec)
+        self.trace = trace
 
-                if now_epoch >= state.next_players_probe_epoch:
-                    players = minecraft_players_online(
-                        host=config.node_ip,
-                        port=server.allocated_port,
-                        timeout_sec=config.minecraft_ping_timeout_sec,
-                    )
-                    if players is not None or state.players_online is None:
-                        state.players_online = players
+    def resolve(self, container_id: str) -> Optional[str]:
+        cgroup_path = super().resolve(container_id)
+        self.trace.record_cgroup(container_id, cgroup_path)
+        return cgroup_path
+
+
+class ReplayFileReader(PseudoFileReader):
+    # Serves each path's latest recorded contents; nothing is opened.
+    def __init__(self) -> None:
+        super().__init__(max_open=0)
+        self.contents: dict[str, Optional[bytes]] = {}
+
+    def read(self, path: str) -> int:
+        contents = self.contents.get(path)
+        if contents is None:
+            return -1
+        length = len(contents)
+        if length >= len(self.buffer):
+            self.buffer.extend(bytes(length + 1 - len(self.buffer)))
+        self.buffer[:length] = contents
+        self.reads += 1
+        self.read_bytes += length
+        return length
+
+
+class ReplayCgroupResolver(CgroupResolver):
+    # Resolves from the recorded paths; the trace also records whatever the
+    # live resolver returned after an invalidation.
+    def __init__(self, cgroup_root: str, unified: bool) -> None:
+        super().__init__(cgroup_root)
+        self.unified = unified
+        self.paths: dict[str, Optional[str]] = {}
+
+    def _resolve(self, container_id: str) -> Optional[str]:
+        cgroup_path = self.paths.get(container_id)
+        if cgroup_path is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return cgroup_path
+
+
+def iter_trace(path: str) -> Iterator[dict[str, Any]]:
+    # Stops quietly at a truncated tail (agent killed mid-write).
+    with gzip.open(path, "rb") as stream:
+        while True:
+            try:
+                line = stream.readline()
+            except (EOFError, OSError):
+                return
+            if not line:
+                return
+            try:
+                yield json.loads(line)
+            except ValueError:
+                return
+
+
+def replay_config(header: dict[str, Any]) -> AgentConfig:
+    values = dict(header["config"])
+    values.update({name: None for name in TRACE_REPLAY_DISABLED})
+    values.update(node_token="", wings_token=None, player_probes=tuple(values["player_probes"]))
+    return AgentConfig(**values)
+
+
+def suspicious_server_rates(payload: dict[str, Any]) -> list[str]:
+    # A server cannot use more CPU than its quota or the node has cores;
+    # readings past that are rate spikes (e.g. a counter reset or a reused
+    # cgroup after a container restart).
+    cores = len(payload["node"].get("cores_busy_pct", ())) or os.cpu_count() or 1
+    findings: list[str] = []
+    for server in payload["servers"]:
+        limit = max(server.get("cpu_quota_pct") or 0.0, cores * 100.0) * 1.05
+        if server["cpu_pct"] > limit:
+            findings.append(f"{payload['timestamp']} {server['server_id']} cpu_pct={server['cpu_pct']} > {limit:.0f}")
+    return findings
+
+
+def replay_cli(argv: list[str]) -> int:
+    parser = argparse.ArgumentParser(
+        prog="main.py replay",
+        description="Re-run sampling from a recorded trace; payloads are written to stdout as NDJSON.",
+    )
+    parser.add_argument("--file", default=os.getenv("AGENT_TRACE_FILE", "").strip() or None)
+    parser.add_argument("--speed", type=float, default=0.0, help="replay speed factor; 0 runs as fast as possible")
+    parser.add_argument("--quiet", action="store_true", help="only print the summary")
+    parser.add_argument("--profile", action="store_true", help="print a cProfile report of the replay to stderr")
+    args = parser.parse_args(argv)
+    if args.file is None:
+        parser.error("--file or AGENT_TRACE_FILE is required")
+
+    records = iter_trace(args.file)
+    try:
+        header = next(records, None)
+    except OSError as exc:
+        print(f"replay: {exc}", file=sys.stderr)
+        return 1
+    if header is None or header.get("k") != "header" or header.get("version") != TRACE_FILE_VERSION:
+        print(f"replay: {args.file} is not a version {TRACE_FILE_VERSION} trace", file=sys.stderr)
+        return 1
+
+    config = replay_config(header)
+    reader = ReplayFileReader()
+    resolver = ReplayCgroupResolver(config.cgroup_root, header["unified"])
+    agent = NodeAgent(config, file_reader=reader, cgroup_resolver=resolver)
+    paths: dict[int, str] = {}
+    samples = 0
+    findings: list[str] = []
+    first_tick: Optional[float] = None
+    started = time.monotonic()
+
+    def run_tick(tick: dict[str, Any]) -> None:
+        nonlocal samples, first_tick
+        if first_tick is None:
+            first_tick = tick["t"]
+        if args.speed > 0:
+            delay = (tick["t"] - first_tick) / args.speed - (time.monotonic() - started)
+            if delay > 0:
+                time.sleep(delay)
+
+        if tick["j"] == "fast":
+            agent.fast_sample_job(tick["t"])
+            return
+        if "s" in tick:
+            agent.servers = tuple(DiscoveredServer(*server) for server in tick["s"])
+        for server in agent._sync_servers():
+            agent._state_for(server)
+        for server_id, players in tick.get("p", {}).items():
+            state = agent.server_states.get(server_id)
+            if state is not None:
+                state.players_online = players
+
+        agent.sample_job(tick["t"], tick["e"])
+        payload = agent.outbox.popleft()
+        samples += 1
+        findings.extend(suspicious_server_rates(payload))
+        if not args.quiet:
+            sys.stdout.write(json.dumps(payload) + "\n")
+
+    def replay() -> None:
+        # A tick's reads follow its tick record, so a tick runs once the
+        # next one (or the end of the trace) is reached.
+        pending: Optional[dict[str, Any]] = None
+        for record in records:
+            kind = record["k"]
+            if kind == "read":
+                data = record["d"]
+                reader.contents[paths[record["i"]]] = None if data is None else data.encode("latin-1")
+            elif kind == "path":
+                paths[record["i"]] = record["p"]
+            elif kind == "cgroup":
+                resolver.paths[record["c"]] = record["p"]
+            elif kind in ("tick", "end"):
+                if pending is not None:
+                    run_tick(pending)
+                pending = record if kind == "tick" else None
+        if pending is not None:
+            print("replay: trace is cut off; its last tick was skipped", file=sys.stderr)
+
+    if args.profile:
+        import cProfile
+        import pstats
+
+        profiler = cProfile.Profile()
+        profiler.runcall(replay)
+        pstats.Stats(profiler, stream=sys.stderr).sort_stats("cumulative").print_stats(30)
+    else:
+        replay()
+    agent.probe_engine.close()
+
+    elapsed = time.monotonic() - started
+    for finding in findings:
+        print(f"suspicious rate: {finding}", file=sys.stderr)
+    latency = " ".join(
+        f"{name}_p99_ms={histogram.summary()['p99_ms']:g}"
+        for name, histogram in agent.phase_latency.items()
+        if histogram.count
+    )
+    print(
+        f"replayed {samples} samples in {elapsed:.2f}s, "
+        f"{len(findings)} suspicious rates, reads={reader.reads} {latency}",
+        file=sys.stderr,
+    )
+    return 0
+
+
+STATE_FILE_VERSION = 1
+# Counters older than this are not restored; a rate over a longer gap would
+# not describe the present.
+STATE_MAX_AGE_SEC = 900.0
 
+
+def read_boot_id() -> Optional[str]:
+    # CLOCK_MONOTONIC only compares across processes within one boot.
+    raw = read_file("/proc/sys/kernel/random/boot_id")
+    return raw.strip() if raw else None
+
+
+def save_agent_state(
+    path: str,
+    boot_id: Optional[str],
+    node_tracker: NodeMetricTracker,
+    resolver: CgroupResolver,
+    store: ServerCounterStore,
+    discovered_servers: list[DiscoveredServer],
+    server_states: dict[str, ServerRuntimeState],
+) -> None:
+    servers: list[dict[str, Any]] = []
+    for server in discovered_servers:
+        state = server_states.get(server.server_id)
+        if state is None:
+            continue
+        servers.append(
+            {
+                "server_id": server.server_id,
+                "container_id": server.container_id,
+                "allocated_port": server.allocated_port,
+                "counters": store.export_slot(state.slot),
+                "last_counters": state.last_counters,
+                "last_counters_monotonic": state.last_counters_monotonic,
+                "players_online": state.players_online,
+            }
+        )
+
+    data = {
+        "version": STATE_FILE_VERSION,
+        "boot_id": boot_id,
+        "saved_monotonic": time.monotonic(),
+        "node": node_tracker.export_state(),
+        "cgroup_paths": resolver.export_paths(),
+        "servers": servers,
+    }
+    try:
+        with open(f"{path}.tmp", "w", encoding="utf-8") as handle:
+            json.dump(data, handle, separators=(",", ":"))
+        os.replace(f"{path}.tmp", path)
+    except OSError as exc:
+        log(f"agent state write failed ({path}): {exc}")
+
+
+def load_agent_state(
+    path: str,
+    boot_id: Optional[str],
+    node_tracker: NodeMetricTracker,
+    resolver: CgroupResolver,
+    store: ServerCounterStore,
+) -> Optional[tuple[list[DiscoveredServer], dict[str, ServerRuntimeState]]]:
+    # Returns the saved server list and states, or None when the file is
+    # missing, unreadable or from another boot.
+    raw = read_file(path)
+    if not raw:
+        return None
+
+    try:
+        data = json.loads(raw)
+        if data.get("version") != STATE_FILE_VERSION or boot_id is None or data.get("boot_id") != boot_id:
+            log("agent state file is from another boot or version; starting cold")
+            return None
+
+        fresh = time.monotonic() - float(data["saved_monotonic"]) <= STATE_MAX_AGE_SEC
+        if fresh and data.get("node"):
+            node_tracker.restore_state(data["node"])
+        resolver.restore_paths(data.get("cgroup_paths") or {})
+
+        discovered_servers: list[DiscoveredServer] = []
+        server_states: dict[str, ServerRuntimeState] = {}
+        for item in data.get("servers") or []:
+            server = DiscoveredServer(
+                server_id=str(item["server_id"]),
+                container_id=str(item["container_id"]),
+                allocated_port=int(item["allocated_port"]),
+            )
+            state = ServerRuntimeState(slot=store.allocate(), players_online=item.get("players_online"))
+            if fresh and item.get("counters"):
+                store.restore_slot(state.slot, [float(value) for value in item["counters"]])
+                state.last_counters = {key: int(value) for key, value in (item.get("last_counters") or {}).items()}
+                state.last_counters_monotonic = item.get("last_counters_monotonic")
+            discovered_servers.append(server)
+            server_states[server.server_id] = state
+    except (ValueError, TypeError, KeyError, AttributeError) as exc:
+        log(f"agent state file unreadable ({path}): {exc}")
+        return None
+
+    return discovered_servers, server_states
+
+
+def raise_keyboard_interrupt(signum: int, frame: Any) -> None:
+    # SIGTERM takes the same shutdown path as Ctrl-C, so state is flushed.
+    raise KeyboardInterrupt
+
+
+def sync_server_states(
+    previous_servers: list[DiscoveredServer],
+    discovered_servers: list[DiscoveredServer],
+    server_states: dict[str, ServerRuntimeState],
+    store: ServerCounterStore,
+) -> dict[str, ServerRuntimeState]:
+    # States are dropped for servers that went away and for servers whose
+    # container was recreated, whose counters restart from zero.
+    previous_containers = {server.server_id: server.container_id for server in previous_servers}
+    synced: dict[str, ServerRuntimeState] = {}
+
+    for server in discovered_servers:
+        state = server_states.get(server.server_id)
+        if state is None or previous_containers.get(server.server_id, server.container_id) != server.container_id:
+            state = ServerRuntimeState(slot=store.allocate(), next_players_probe_epoch=0.0)
+        synced[server.server_id] = state
+
+    kept_slots = {state.slot for state in synced.values()}
+    for state in server_states.values():
+        if state.slot not in kept_slots:
+            store.release(state.slot)
+
+    return synced
+
+
+@dataclass
+class JobStats:
+    runs: int = 0
+    overruns: int = 0
+    errors: int = 0
+    last_duration_sec: float = 0.0
+    max_duration_sec: float = 0.0
+    max_lag_sec: float = 0.0
+
+
+class ScheduledJob:
+    # run(now_monotonic) returns the delay until its next run, counted from
+    # when this run was due, so the cadence does not drift with run time.
+    def __init__(self, name: str, run: Callable[[float], float], first_run_monotonic: float = 0.0) -> None:
+        self.name = name
+        self.run = run
+        self.next_run_monotonic = first_run_monotonic
+        self.stats = JobStats()
+
+
+class SchedulerLane:
+    # One thread running its jobs one at a time in due order. Jobs that share
+    # non-thread-safe state (the PseudoFileReader buffer, server states) go
+    # in the same lane; a slow job only delays jobs in its own lane.
+    ERROR_RETRY_SEC = 1.0
+
+    def __init__(self, name: str, jobs: list[ScheduledJob], stop_event: threading.Event) -> None:
+        self.name = name
+        self.jobs = jobs
+        self._stop_event = stop_event
+        self._thread = threading.Thread(target=self._run, name=f"lane-{name}", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def join(self, timeout_sec: float) -> None:
+        self._thread.join(timeout_sec)
+
+    def _run(self) -> None:
+        while not self._stop_event.is_set():
+            job = min(self.jobs, key=lambda candidate: candidate.next_run_monotonic)
+            delay_sec = job.next_run_monotonic - time.monotonic()
+            if delay_sec > 0 and self._stop_event.wait(delay_sec):
+                return
+
+            started = time.monotonic()
+            stats = job.stats
+            stats.max_lag_sec = max(stats.max_lag_sec, started - job.next_run_monotonic)
+            try:
+                interval_sec = job.run(started)
+            except Exception as exc:  # noqa: BLE001
+                log(f"unexpected {job.name} job error: {exc}")
+                stats.errors += 1
+                interval_sec = self.ERROR_RETRY_SEC
+            finished = time.monotonic()
+
+            stats.runs += 1
+            stats.last_duration_sec = finished - started
+            stats.max_duration_sec = max(stats.max_duration_sec, stats.last_duration_sec)
+            next_run = job.next_run_monotonic + max(interval_sec, 0.0)
+            if finished > next_run:
+                # Overran its slot: run again right away once, without
+                # trying to catch up on the missed runs.
+                stats.overruns += 1
+                next_run = finished
+            job.next_run_monotonic = next_run
+
+
+class JobScheduler:
+    def __init__(self) -> None:
+        self.lanes: list[SchedulerLane] = []
+        self._stop_event = threading.Event()
+
+    def add_lane(self, name: str, jobs: list[ScheduledJob]) -> None:
+        self.lanes.append(SchedulerLane(name, jobs, self._stop_event))
+
+    @property
+    def jobs(self) -> list[ScheduledJob]:
+        return [job for lane in self.lanes for job in lane.jobs]
+
+    def start(self) -> None:
+        for lane in self.lanes:
+            lane.start()
+
+    def stop(self, timeout_sec: float) -> None:
+        self._stop_event.set()
+        deadline = time.monotonic() + timeout_sec
+        for lane in self.lanes:
+            lane.join(max(deadline - time.monotonic(), 0.0))
+
+
+class ProcessUsage:
+    # The agent's own CPU time (percent of one core since the previous call)
+    # and resident set size.
+    PAGE_BYTES = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+    def __init__(self) -> None:
+        self._last_cpu_sec: Optional[float] = None
+        self._last_monotonic: Optional[float] = None
+
+    def sample(self, now_monotonic: float) -> tuple[Optional[float], Optional[int]]:
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        cpu_sec = usage.ru_utime + usage.ru_stime
+        cpu_pct: Optional[float] = None
+        if self._last_cpu_sec is not None and self._last_monotonic is not None and now_monotonic > self._last_monotonic:
+            cpu_pct = (cpu_sec - self._last_cpu_sec) / (now_monotonic - self._last_monotonic) * 100.0
+        self._last_cpu_sec = cpu_sec
+        self._last_monotonic = now_monotonic
+
+        rss_bytes: Optional[int] = None
+        statm = read_file("/proc/self/statm")
+        if statm:
+            rss_bytes = int(statm.split()[1]) * self.PAGE_BYTES
+        return cpu_pct, rss_bytes
+
+
+class NodeAgent:
+    # Discovery, sampling (with probing and state saves) and publishing run as
+    # separate scheduler lanes. Discovery hands the server list over as an
+    # immutable tuple and sampling hands payloads to publishing through a
+    # bounded deque; both are single reference swaps / appends, no locks.
+    OUTBOX_MAX_SAMPLES = 1000
+    EVENTS_POLL_SEC = 1.0
+    PROBE_POLL_SEC = 1.0
+    PUBLISH_POLL_SEC = 0.5
+    REPORT_INTERVAL_SEC = 300.0
+
+    def __init__(
+        self,
+        config: AgentConfig,
+        file_reader: Optional[PseudoFileReader] = None,
+        cgroup_resolver: Optional[CgroupResolver] = None,
+    ) -> None:
+        # file_reader and cgroup_resolver are replaced by trace replay.
+        self.config = config
+        self.http_client = HttpClient(timeout_sec=config.http_timeout_sec, insecure_tls=config.insecure_tls)
+        self.discoverer = WingsDiscoverer(config, self.http_client)
+        self.trace: Optional[TraceWriter] = None
+        if config.trace_file is not None and file_reader is None and cgroup_resolver is None:
+            self.trace = TraceWriter(config.trace_file, config.trace_max_bytes, config)
+            file_reader = RecordingFileReader(self.trace)
+            cgroup_resolver = RecordingCgroupResolver(self.trace, config.cgroup_root, config.cgroup_miss_ttl_sec)
+            log(f"recording sampling trace to {config.trace_file}")
+        self.cgroup_resolver = cgroup_resolver or CgroupResolver(
+            config.cgroup_root, miss_ttl_sec=config.cgroup_miss_ttl_sec
+        )
+        self.file_reader = file_reader or PseudoFileReader()
+        self.node_tracker = NodeMetricTracker(self.file_reader)
+        self.publisher = OrchestratorPublisher(config, self.http_client)
+        self.probe_engine = PlayerProbeEngine(config, self.file_reader)
+        self.spool: Optional[TelemetrySpool] = None
+        if config.spool_dir is not None:
+            self.spool = TelemetrySpool(
+                directory=config.spool_dir,
+                max_bytes=config.spool_max_bytes,
+                segment_bytes=config.spool_segment_bytes,
+                fsync_interval_sec=config.spool_fsync_interval_sec,
+            )
+
+        self.history: Optional[HistoryRing] = None
+        if config.history_file is not None:
+            self.history = HistoryRing(config.history_file, config.history_max_bytes)
+        self.local_http: Optional[LocalHttpServer] = None
+        if config.local_http_addr is not None:
+            self.local_http = LocalHttpServer(config.local_http_addr)
+            if self.history is not None:
+                self.local_http.routes["/history"] = history_route(self.history)
+            self.local_http.routes["/metrics"] = lambda params: (OPENMETRICS_CONTENT_TYPE, self.metrics_text)
+        self.metrics_text = b"# EOF\n"
+
+        self.event_watcher: Optional[DockerEventWatcher] = None
+        if config.docker_socket is not None:
+            self.event_watcher = DockerEventWatcher(config.docker_socket)
+
+        self.counter_store = ServerCounterStore()
+        self.delta_encoder: Optional[DeltaEncoder] = None
+        if config.delta_encoding:
+            self.delta_encoder = DeltaEncoder(
+                keyframe_interval=config.delta_keyframe_interval,
+                cpu_deadband_pct=config.delta_cpu_deadband_pct,
+                io_deadband_bytes_per_s=config.delta_io_deadband_bytes_per_s,
+            )
+
+        self.fast_intervals = [config.fast_sample_interval_sec] if config.fast_sample_interval_sec > 0 else []
+        if config.adaptive_sampling:
+            self.fast_intervals.append(config.burst_sample_interval_sec)
+        self.window_capacity = 0
+        if self.fast_intervals:
+            self.window_capacity = math.ceil(config.sample_interval_max_sec / min(self.fast_intervals)) + 2
+
+        # Discovery lane.
+        self.servers: tuple[DiscoveredServer, ...] = ()
+        self._discovered: list[DiscoveredServer] = []
+        self._known_servers: dict[str, DiscoveredServer] = {}
+        self._next_discovery_at = 0.0
+
+        # Sampling lane.
+        self._sampled_servers: tuple[DiscoveredServer, ...] = ()
+        self.server_states: dict[str, ServerRuntimeState] = {}
+
+        # Publishing lane.
+        self.outbox: deque[dict[str, Any]] = deque(maxlen=self.OUTBOX_MAX_SAMPLES)
+        self._pending_samples: list[dict[str, Any]] = []
+        self._pending_since = 0.0
+        self._next_send_at = 0.0
+        self._next_publish_at = 0.0
+        self._send_backoff_sec = 1.0
+        self._send_interval_sec = 0.0
+
+        self.boot_id = read_boot_id()
+        if config.state_file is not None:
+            restored = load_agent_state(
+                config.state_file, self.boot_id, self.node_tracker, self.cgroup_resolver, self.counter_store
+            )
+            if restored is not None:
+                discovered, self.server_states = restored
+                self._discovered = discovered
+                self._known_servers.update((server.server_id, server) for server in discovered)
+                self.servers = self._sampled_servers = tuple(discovered)
+                # Sample the restored servers first; discovery reconciles shortly.
+                self._next_discovery_at = time.monotonic() + 5.0
+                log(f"restored agent state for {len(discovered)} servers")
+
+        # Self-instrumentation; components keep their own histograms and
+        # counters, these cover the loop phases.
+        self.phase_latency = {
+            name: LatencyHistogram() for name in ("discovery", "node_sample", "server_sample", "payload")
+        }
+        self._sample_usage = ProcessUsage()
+        self._report_usage = ProcessUsage()
+
+        now_monotonic = time.monotonic()
+        self._sample_usage.sample(now_monotonic)
+        self._report_usage.sample(now_monotonic)
+        self.scheduler = JobScheduler()
+        self.scheduler.add_lane(
+            "discovery",
+            [
+                ScheduledJob("discovery", self.discovery_job, now_monotonic),
+                ScheduledJob("report", self.report_job, now_monotonic + self.REPORT_INTERVAL_SEC),
+            ],
+        )
+        sample_jobs = [
+            ScheduledJob("sample", self.sample_job, now_monotonic),
+            ScheduledJob("probe", self.probe_job, now_monotonic),
+        ]
+        if self.fast_intervals:
+            sample_jobs.append(ScheduledJob("fast-sample", self.fast_sample_job, now_monotonic))
+        if config.state_file is not None:
+            sample_jobs.append(
+                ScheduledJob("state-save", self.state_save_job, now_monotonic + config.state_save_interval_sec)
+            )
+        self.scheduler.add_lane("sample", sample_jobs)
+        self.scheduler.add_lane("publish", [ScheduledJob("publish", self.publish_job, now_monotonic)])
+
+    def start(self) -> None:
+        if self.local_http is not None:
+            self.local_http.start()
+        if self.event_watcher is not None:
+            self.event_watcher.start()
+        self.scheduler.start()
+
+    def discovery_job(self, now_monotonic: float) -> float:
+        if self.event_watcher is not None:
+            events = self.event_watcher.drain()
+            if events:
+                self._discovered, reconcile = apply_container_events(events, self._discovered, self._known_servers)
+                self.servers = tuple(self._discovered)
+                if reconcile:
+                    self._next_discovery_at = min(self._next_discovery_at, now_monotonic)
+
+        if now_monotonic >= self._next_discovery_at:
+            started = time.perf_counter()
+            self._discovered = self.discoverer.discover_servers()
+            self.phase_latency["discovery"].observe(time.perf_counter() - started)
+            self._known_servers.update((server.server_id, server) for server in self._discovered)
+            self.servers = tuple(self._discovered)
+
+            discovery_interval_sec = self.config.discovery_interval_sec
+            if self.event_watcher is not None and self.event_watcher.connected:
+                # Lifecycle events keep the server set current; Wings
+                # polling is only a periodic reconciliation.
+                discovery_interval_sec = self.config.discovery_fallback_interval_sec
+            self._next_discovery_at = now_monotonic + max(discovery_interval_sec, 5.0)
+            log(
+                f"discovered {len(self._discovered)} running servers "
+                f"(cgroup resolve hits={self.cgroup_resolver.hits}, misses={self.cgroup_resolver.misses}, "
+                f"index_rebuilds={self.cgroup_resolver.index_rebuilds})"
+            )
+
+        if self.event_watcher is None:
+            return max(self._next_discovery_at - now_monotonic, 0.0)
+        return min(self.EVENTS_POLL_SEC, max(self._next_discovery_at - now_monotonic, 0.0))
+
+    def _sync_servers(self) -> tuple[DiscoveredServer, ...]:
+        # Picks up a new server list from the discovery lane.
+        servers = self.servers
+        if servers is not self._sampled_servers:
+            self.server_states = sync_server_states(
+                list(self._sampled_servers), list(servers), self.server_states, self.counter_store
+            )
+            self._sampled_servers = servers
+            self.cgroup_resolver.forget_except({server.container_id for server in servers})
+            self.file_reader.prune()
+        return servers
+
+    def _state_for(self, server: DiscoveredServer) -> ServerRuntimeState:
+        state = self.server_states.get(server.server_id)
+        if state is None:
+            state = ServerRuntimeState(slot=self.counter_store.allocate(), next_players_probe_epoch=0.0)
+            self.server_states[server.server_id] = state
+        return state
+
+    def probe_job(self, now_monotonic: float) -> float:
+        config = self.config
+        now_epoch = time.time()
+        for server in self._sync_servers():
+            state = self._state_for(server)
+            if now_epoch < state.next_players_probe_epoch:
+                continue
+            if self.probe_engine.submit(
+                server_id=server.server_id,
+                host=config.node_ip,
+                port=server.allocated_port,
+                now_monotonic=now_monotonic,
+                cgroup_path=self.cgroup_resolver.resolve(server.container_id),
+            ):
+                if config.adaptive_sampling and server_is_idle(state, config, now_monotonic):
+                    state.next_players_probe_epoch = now_epoch + config.idle_players_interval_sec
+                else:
                     state.next_players_probe_epoch = now_epoch + random.uniform(
                         config.players_interval_min_sec,
                         config.players_interval_max_sec,
                     )
 
-                servers_payload.append(
-                    {
-                        "server_id": server.server_id,
-                        "players_online": state.players_online,
-                        "cpu_pct": round(cpu_pct, 3),
-                        "io_write_bytes_per_s": round(io_write_bps, 3),
-                    }
-                )
+        self.probe_engine.harvest(self.server_states, time.monotonic())
+        return self.PROBE_POLL_SEC
 
-            payload = {
-                "node_id": config.node_id,
-                "timestamp": datetime.now(timezone.utc).isoformat(),
-                "node": {
-                    "cpu_pct": round(node_metrics.cpu_pct, 3),
-                    "iowait_pct": round(node_metrics.iowait_pct, 3),
-                },
-                "servers": servers_payload,
-            }
+    def sample_job(self, now_monotonic: float, now_epoch: Optional[float] = None) -> float:
+        config = self.config
+        if now_epoch is None:
+            now_epoch = time.time()
+        if self.trace is not None:
+            self.trace.record_tick("sample", now_monotonic, now_epoch, self.servers, self.server_states)
+        started = time.perf_counter()
+        node_metrics = self.node_tracker.sample(now_monotonic)
+        self.phase_latency["node_sample"].observe(time.perf_counter() - started)
+        due: list[tuple[DiscoveredServer, ServerRuntimeState]] = []
+        sampled: list[tuple[DiscoveredServer, ServerRuntimeState, Optional[ServerMetrics]]] = []
+
+        for server in self._sync_servers():
+            state = self._state_for(server)
+            if config.adaptive_sampling and state.last_metrics is not None and not server_is_idle(
+                state, config, now_monotonic
+            ):
+                # A server that stopped being idle (e.g. a player joined)
+                # is due right away instead of at the idle interval.
+                state.next_sample_monotonic = min(state.next_sample_monotonic, now_monotonic)
+            if state.last_metrics is not None and now_monotonic < state.next_sample_monotonic:
+                # Not due yet: repeat the last sample so the server stays
+                # in the payload.
+                sampled.append((server, state, state.last_metrics))
+                continue
 
-            if now_monotonic >= next_send_at:
-                sent = publisher.publish(payload)
-                if sent:
-                    send_backoff_sec = 1.0
-                    next_send_at = now_monotonic
-                else:
-                    next_send_at = now_monotonic + send_backoff_sec
-                    send_backoff_sec = min(send_backoff_sec * 2.0, max(config.send_backoff_max_sec, 1.0))
+            due.append((server, state))
+            sampled.append((server, state, None))
+
+        started = time.perf_counter()
+        due_metrics = iter(
+            sample_servers(
+                due,
+                store=self.counter_store,
+                resolver=self.cgroup_resolver,
+                reader=self.file_reader,
+                now_monotonic=now_monotonic,
+                contention_metrics=config.contention_metrics,
+            )
+        )
+        self.phase_latency["server_sample"].observe(time.perf_counter() - started)
+        for index, (server, state, metrics) in enumerate(sampled):
+            if metrics is not None:
+                continue
+            metrics = summarize_windows(state, next(due_metrics))
+            if config.adaptive_sampling:
+                update_server_cadence(state, metrics, config, now_monotonic)
+            if fast_sample_interval(state, config, now_monotonic) is None:
+                state.cpu_window = None
+                state.io_window = None
+            elif state.cpu_window is None or state.io_window is None:
+                state.cpu_window = MetricWindow(self.window_capacity)
+                state.io_window = MetricWindow(self.window_capacity)
+            state.last_metrics = metrics
+            sampled[index] = (server, state, metrics)
+
+        started = time.perf_counter()
+        servers_payload: list[dict[str, Any]] = [
+            server_payload(server, state, metrics)
+            for server, state, metrics in sampled
+        ]
 
-            time.sleep(
-                random.uniform(
-                    config.sample_interval_min_sec,
-                    config.sample_interval_max_sec,
+        payload = {
+            "node_id": config.node_id,
+            "timestamp": datetime.fromtimestamp(now_epoch, timezone.utc).isoformat(),
+            "node": node_payload(node_metrics),
+            "servers": servers_payload,
+        }
+        if self.history is not None:
+            self.history.record_sample(now_epoch, node_metrics, sampled)
+        if self.local_http is not None:
+            self.metrics_text = render_openmetrics(now_epoch, node_metrics, sampled)
+        if config.self_metrics:
+            payload["agent"] = self.agent_metrics(self._sample_usage, now_monotonic)
+        self.phase_latency["payload"].observe(time.perf_counter() - started)
+        self.outbox.append(payload)
+
+        return random.uniform(config.sample_interval_min_sec, config.sample_interval_max_sec)
+
+    def fast_sample_job(self, now_monotonic: float) -> float:
+        # High-frequency / burst mode: sample cpu/io into the per-server
+        # windows between full samples.
+        if self.trace is not None:
+            self.trace.record_tick("fast", now_monotonic, time.time())
+        tick_sec = min(self.fast_intervals)
+        fast_due: list[tuple[DiscoveredServer, ServerRuntimeState]] = []
+        for server in self._sampled_servers:
+            state = self.server_states.get(server.server_id)
+            if state is None or state.cpu_window is None:
+                continue
+            interval_sec = fast_sample_interval(state, self.config, now_monotonic)
+            if interval_sec is None or now_monotonic < state.next_fast_sample_monotonic:
+                continue
+            state.next_fast_sample_monotonic = now_monotonic + interval_sec - tick_sec / 2.0
+            fast_due.append((server, state))
+        sample_servers_cpu_io(fast_due, self.counter_store, self.cgroup_resolver, self.file_reader, now_monotonic)
+        return tick_sec
+
+    def state_save_job(self, now_monotonic: float) -> float:
+        self.save_state()
+        return self.config.state_save_interval_sec
+
+    def save_state(self) -> None:
+        if self.config.state_file is None:
+            return
+        save_agent_state(
+            self.config.state_file,
+            self.boot_id,
+            self.node_tracker,
+            self.cgroup_resolver,
+            self.counter_store,
+            list(self._sampled_servers),
+            self.server_states,
+        )
+
+    def publish_job(self, now_monotonic: float) -> float:
+        while self.outbox:
+            self._send(self.outbox.popleft(), time.monotonic())
+        if self.spool is not None:
+            self.spool.sync(force=False)
+        return self.PUBLISH_POLL_SEC
+
+    def _send(self, payload: dict[str, Any], now_monotonic: float) -> None:
+        config = self.config
+        spool = self.spool
+        if now_monotonic < self._next_send_at:
+            if spool is not None:
+                spool.append(self._encode(payload))
+                self._undelivered()
+            return
+
+        if not self._pending_samples:
+            self._pending_since = now_monotonic
+        self._pending_samples.append(payload)
+
+        if now_monotonic < self._next_publish_at or (
+            len(self._pending_samples) < config.upload_batch_size
+            and now_monotonic - self._pending_since < config.upload_batch_max_age_sec
+        ):
+            return
+
+        pending_samples = self._pending_samples
+        self._pending_samples = []
+        if len(pending_samples) > 1 and not self.publisher.batching:
+            # Held back by the orchestrator's send interval and unable to
+            # batch: only the newest sample is sent.
+            log(f"dropping {len(pending_samples) - 1} telemetry samples to honour send interval")
+            pending_samples = pending_samples[-1:]
+        # Delta-encoded only now, so dropped samples never enter the baseline.
+        pending_samples = [self._encode(sample) for sample in pending_samples]
+
+        result = self.publisher.publish_samples(pending_samples)
+        requested_interval_sec = result.send_interval_sec or 0.0
+        if requested_interval_sec != self._send_interval_sec:
+            log(f"orchestrator send interval now {requested_interval_sec:g}s")
+        self._send_interval_sec = requested_interval_sec
+        if result.sent:
+            self._send_backoff_sec = 1.0
+            self._next_send_at = now_monotonic
+            self._next_publish_at = now_monotonic + self._send_interval_sec
+            # Replay is itself extra load, so it waits until the
+            # orchestrator stops asking for a send interval.
+            if spool is not None and spool.has_pending() and not self._send_interval_sec:
+                replayed = spool.drain(
+                    self.publisher.publish_samples,
+                    config.spool_replay_batch,
+                    chunk_size=config.upload_batch_size,
                 )
-            )
-        except KeyboardInterrupt:
-            log("node agent interrupted; exiting")
-            raise
-        except Exception as exc:  # noqa: BLE001
-            log(f"unexpected loop error: {exc}")
-            time.sleep(1.0)
+                if replayed:
+                    log(f"replayed {replayed} spooled telemetry samples")
+        else:
+            if spool is not None and result.retryable:
+                for sample in pending_samples:
+                    spool.append(sample)
+            self._undelivered()
+            # Full jitter keeps a fleet of agents from retrying in lockstep;
+            # Retry-After is a lower bound.
+            delay_sec = random.uniform(0.0, self._send_backoff_sec)
+            if result.retry_after_sec is not None:
+                delay_sec = max(delay_sec, result.retry_after_sec)
+            self._next_send_at = now_monotonic + max(delay_sec, self._send_interval_sec)
+            self._send_backoff_sec = min(self._send_backoff_sec * 2.0, max(config.send_backoff_max_sec, 1.0))
+
+    def _encode(self, payload: dict[str, Any]) -> dict[str, Any]:
+        if self.delta_encoder is None:
+            return payload
+        return self.delta_encoder.encode(payload)
+
+    def _undelivered(self) -> None:
+        # Spooled samples are replayed late and rejected ones never arrive;
+        # either way the orchestrator is behind the delta baseline.
+        if self.delta_encoder is not None:
+            self.delta_encoder.force_keyframe()
+
+    def latency_histograms(self) -> dict[str, LatencyHistogram]:
+        histograms = dict(self.phase_latency)
+        histograms["cgroup_resolve"] = self.cgroup_resolver.resolve_latency
+        histograms["publish_encode"] = self.publisher.encode_latency
+        histograms["publish_post"] = self.publisher.post_latency
+        for name, histogram in self.probe_engine.probe_latency.items():
+            histograms[f"probe_{name}"] = histogram
+        return histograms
+
+    def agent_metrics(self, usage: ProcessUsage, now_monotonic: float) -> dict[str, Any]:
+        # The optional "agent" telemetry block; counters are totals since start.
+        cpu_pct, rss_bytes = usage.sample(now_monotonic)
+        return {
+            "cpu_pct": None if cpu_pct is None else round(cpu_pct, 3),
+            "rss_bytes": rss_bytes,
+            "file_reads": self.file_reader.reads,
+            "file_read_bytes": self.file_reader.read_bytes,
+            "file_opens": self.file_reader.opens,
+            "cgroup_resolve_hits": self.cgroup_resolver.hits,
+            "cgroup_resolve_misses": self.cgroup_resolver.misses,
+            "cgroup_index_rebuilds": self.cgroup_resolver.index_rebuilds,
+            "publish_payload_bytes": self.publisher.payload_bytes,
+            "publish_wire_bytes": self.publisher.wire_bytes,
+            "latency": {name: histogram.summary() for name, histogram in self.latency_histograms().items()},
+            "jobs": {
+                job.name: {
+                    "runs": job.stats.runs,
+                    "overruns": job.stats.overruns,
+                    "errors": job.stats.errors,
+                    "max_duration_ms": round(job.stats.max_duration_sec * 1000.0, 3),
+                }
+                for job in self.scheduler.jobs
+            },
+        }
+
+    def report_job(self, now_monotonic: float) -> float:
+        metrics = self.agent_metrics(self._report_usage, now_monotonic)
+        p99 = " ".join(
+            f"{name}={summary['p99_ms']:g}"
+            for name, summary in metrics["latency"].items()
+            if summary["count"]
+        )
+        rss_mib = (metrics["rss_bytes"] or 0) / (1024 * 1024)
+        log(
+            f"agent self: cpu={metrics['cpu_pct'] or 0.0:.2f}% rss={rss_mib:.1f}MiB "
+            f"file_reads={metrics['file_reads']} file_read_bytes={metrics['file_read_bytes']} "
+            f"publish_bytes={metrics['publish_payload_bytes']} wire_bytes={metrics['publish_wire_bytes']} "
+            f"p99_ms: {p99}"
+        )
+
+        overrun = [
+            f"{job.name}={job.stats.overruns}/{job.stats.runs} (max {job.stats.max_duration_sec:.2f}s)"
+            for job in self.scheduler.jobs
+            if job.stats.overruns or job.stats.errors
+        ]
+        if overrun:
+            log(f"scheduler overruns: {', '.join(overrun)}")
+        return self.REPORT_INTERVAL_SEC
+
+    def close(self) -> None:
+        # Called after the scheduler lanes have stopped.
+        self.save_state()
+        self.probe_engine.close()
+        if self.local_http is not None:
+            self.local_http.stop()
+        if self.history is not None:
+            self.history.flush()
+            self.history.close()
+        if self.event_watcher is not None:
+            self.event_watcher.stop()
+        self.http_client.close()
+        self.file_reader.close_all()
+        if self.trace is not None:
+            self.trace.close()
+        if self.spool is not None:
+            # Samples not yet posted survive the restart in the spool.
+            for sample in [*self._pending_samples, *self.outbox]:
+                self.spool.append(self._encode(sample))
+            self.spool.close()
+
+
+def run() -> None:
+    config = AgentConfig.from_env()
+    agent = NodeAgent(config)
+    if threading.current_thread() is threading.main_thread():
+        signal.signal(signal.SIGTERM, raise_keyboard_interrupt)
+
+    log(
+        "node agent started "
+        f"(node_id={config.node_id}, orchestrator={config.orchestrator_base_url}, wings={config.wings_base_url})"
+    )
+    if config.upload_compression == "zstd" and zstandard is None:
+        log("zstandard module not installed; batch uploads use gzip")
+
+    agent.start()
+    try:
+        while True:
+            time.sleep(3600.0)
+    except KeyboardInterrupt:
+        log("node agent interrupted; exiting")
+        agent.scheduler.stop(timeout_sec=config.http_timeout_sec + 5.0)
+        agent.close()
+        raise
 
 
 if __name__ == "__main__":
+    if sys.argv[1:2] == ["history"]:
+        sys.exit(history_cli(sys.argv[2:]))
+    if sys.argv[1:2] == ["replay"]:
+        sys.exit(replay_cli(sys.argv[2:]))
     run()
@@ -0,0 +1,29 @@
+import os
+import sys
+
+# The agent ships as a single main.py next to this directory rather than an
+# installed package.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest  # noqa: E402
+
+import main  # noqa: E402
+
+AGENT_ENV = {
+    "NODE_ID": "node-1",
+    "NODE_TOKEN": "secret",
+    "NODE_IP": "127.0.0.1",
+    "ORCHESTRATOR_BASE_URL": "http://127.0.0.1:9",
+}
+
+
+@pytest.fixture
+def agent_config(monkeypatch):
+    # Builds an AgentConfig through from_env(); keyword arguments set or
+    # override environment variables on top of the required ones.
+    def factory(**env: str) -> main.AgentConfig:
+        for name, value in {**AGENT_ENV, **env}.items():
+            monkeypatch.setenv(name, value)
+        return main.AgentConfig.from_env()
+
+    return factory
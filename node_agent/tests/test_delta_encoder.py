@@ -0,0 +1,94 @@
+from typing import Any
+
+import main
+
+
+def server(server_id: str, cpu_pct: float, players: int = 0) -> dict[str, Any]:
+    return {"server_id": server_id, "cpu_pct": cpu_pct, "io_write_bytes_per_s": 0.0, "players_online": players}
+
+
+def sample(*servers: dict[str, Any]) -> dict[str, Any]:
+    return {"node_id": "node-1", "timestamp": "2026-01-01T00:00:00Z", "node": {}, "servers": list(servers)}
+
+
+def make_encoder() -> main.DeltaEncoder:
+    return main.DeltaEncoder(keyframe_interval=30, cpu_deadband_pct=1.0, io_deadband_bytes_per_s=65536.0)
+
+
+def test_deltas_carry_only_changed_servers():
+    encoder = make_encoder()
+
+    first = encoder.encode(sample(server("a", 10.0), server("b", 20.0)))
+    second = encoder.encode(sample(server("a", 10.5), server("b", 30.0)))
+    third = encoder.encode(sample(server("a", 10.5)))
+
+    assert (first["seq"], first["keyframe"], len(first["servers"])) == (1, True, 2)
+    assert (second["seq"], second["keyframe"]) == (2, False)
+    assert [entry["server_id"] for entry in second["servers"]] == ["b"]
+    assert third["servers"] == []
+    assert third["removed_servers"] == ["b"]
+
+
+def test_force_keyframe_resends_every_server_once():
+    encoder = make_encoder()
+    encoder.encode(sample(server("a", 10.0), server("b", 20.0)))
+    # This delta never reaches the orchestrator.
+    encoder.encode(sample(server("a", 10.0), server("b", 50.0)))
+
+    encoder.force_keyframe()
+    recovered = encoder.encode(sample(server("a", 10.0), server("b", 50.0)))
+    following = encoder.encode(sample(server("a", 10.0), server("b", 50.0)))
+
+    assert recovered["keyframe"]
+    assert "removed_servers" not in recovered
+    assert [entry["cpu_pct"] for entry in recovered["servers"]] == [10.0, 50.0]
+    assert not following["keyframe"]
+    assert following["servers"] == []
+
+
+class StubPublisher:
+    # Answers every post with the next scripted result.
+    def __init__(self, *results: main.PublishResult, batching: bool = False) -> None:
+        self.results = list(results)
+        self.batching = batching
+        self.posted: list[list[dict[str, Any]]] = []
+
+    def publish_samples(self, payloads: list[dict[str, Any]]) -> main.PublishResult:
+        self.posted.append(payloads)
+        return self.results.pop(0)
+
+
+def test_rejected_sample_makes_the_next_one_a_keyframe(agent_config):
+    agent = main.NodeAgent(agent_config(AGENT_DELTA_ENCODING="true"))
+    agent.publisher = StubPublisher(
+        main.PublishResult(sent=True, retryable=False),
+        main.PublishResult(sent=False, retryable=False),
+    )
+    try:
+        agent._send(sample(server("a", 10.0)), 0.0)
+        agent._send(sample(server("a", 50.0)), 1.0)
+
+        assert agent.delta_encoder.encode(sample(server("a", 50.0)))["keyframe"]
+    finally:
+        agent.close()
+
+
+def test_samples_dropped_for_the_send_interval_never_enter_the_baseline(agent_config):
+    agent = main.NodeAgent(agent_config(AGENT_DELTA_ENCODING="true"))
+    agent.publisher = StubPublisher(
+        main.PublishResult(sent=True, retryable=False, send_interval_sec=10.0),
+        main.PublishResult(sent=True, retryable=False, send_interval_sec=10.0),
+    )
+    try:
+        agent._send(sample(server("a", 10.0), server("b", 20.0)), 0.0)
+        # Held back by the send interval; only the newest is posted at 10s.
+        agent._send(sample(server("a", 50.0), server("b", 20.0)), 1.0)
+        agent._send(sample(server("a", 50.0), server("b", 20.0)), 2.0)
+        agent._send(sample(server("a", 50.0), server("b", 20.0)), 10.0)
+
+        first, [newest] = agent.publisher.posted
+        assert first[0]["keyframe"]
+        assert (newest["seq"], newest["keyframe"]) == (2, False)
+        assert newest["servers"] == [server("a", 50.0)]
+    finally:
+        agent.close()
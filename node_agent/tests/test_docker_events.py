@@ -0,0 +1,191 @@
+import http.server
+import json
+import socketserver
+import threading
+import time
+import urllib.parse
+from typing import Any
+
+import pytest
+
+import main
+
+
+class FakeDockerEngine:
+    # Serves /events on a Unix socket as chunked NDJSON. Each connection takes
+    # the next scripted session: its events are written, then the stream is
+    # closed (to force a reconnect) unless it is the last session, which is
+    # held open until stop().
+    def __init__(self, socket_path: str, sessions: list[list[dict[str, Any]]]) -> None:
+        self.sessions = list(sessions)
+        self.paths: list[str] = []
+        self._released = threading.Event()
+        self.server = socketserver.ThreadingUnixStreamServer(socket_path, self._handler())
+        self.server.daemon_threads = True
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._released.set()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _handler(self) -> type:
+        engine = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self) -> None:  # noqa: N802
+                engine.paths.append(self.path)
+                events = engine.sessions.pop(0) if engine.sessions else []
+                last_session = not engine.sessions
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                for event in events:
+                    line = json.dumps(event).encode("utf-8") + b"\n"
+                    self.wfile.write(f"{len(line):x}\r\n".encode("ascii") + line + b"\r\n")
+                    self.wfile.flush()
+                if last_session:
+                    engine._released.wait(5.0)
+                self.close_connection = True
+                try:
+                    self.wfile.write(b"0\r\n\r\n")
+                except OSError:
+                    # The watcher hung up first (stop()).
+                    pass
+
+            def log_message(self, format: str, *args: Any) -> None:  # noqa: A002
+                pass
+
+        return Handler
+
+
+def docker_event(action: str, container_id: str, name: str) -> dict[str, Any]:
+    return {
+        "Type": "container",
+        "Action": action,
+        "Actor": {"ID": container_id, "Attributes": {"name": name, "image": "ghcr.io/pterodactyl/yolks:java_21"}},
+        "time": 1767225600,
+    }
+
+
+OLD_ID = "a" * 64
+NEW_ID = "b" * 64
+OTHER_ID = "c" * 64
+UNKNOWN_ID = "d" * 64
+
+
+@pytest.fixture
+def watch(tmp_path):
+    started: list[tuple[FakeDockerEngine, main.DockerEventWatcher]] = []
+
+    def factory(sessions: list[list[dict[str, Any]]]) -> tuple[FakeDockerEngine, main.DockerEventWatcher]:
+        socket_path = str(tmp_path / "docker.sock")
+        engine = FakeDockerEngine(socket_path, sessions)
+        engine.start()
+        watcher = main.DockerEventWatcher(socket_path)
+        watcher.RECONNECT_SEC = 0.05
+        watcher.start()
+        started.append((engine, watcher))
+        return engine, watcher
+
+    yield factory
+    for engine, watcher in started:
+        watcher.stop()
+        engine.stop()
+
+
+def drain_until(watcher: main.DockerEventWatcher, count: int) -> list[main.ContainerEvent]:
+    events: list[main.ContainerEvent] = []
+    deadline = time.monotonic() + 5.0
+    while len(events) < count and time.monotonic() < deadline:
+        events.extend(watcher.drain())
+        time.sleep(0.01)
+    return events
+
+
+def test_event_stream_drives_running_set(watch):
+    engine, watcher = watch(
+        [
+            [
+                docker_event("start", NEW_ID, "/srv-1"),
+                docker_event("die", OTHER_ID, "/srv-2"),
+                {"Type": "container", "Action": "exec_start: sh", "Actor": {"ID": NEW_ID}},
+                docker_event("start", UNKNOWN_ID, "/not-a-server"),
+            ],
+            [docker_event("destroy", NEW_ID, "/srv-1")],
+        ]
+    )
+
+    events = drain_until(watcher, 6)
+
+    assert [(event.action, event.container_id, event.name) for event in events] == [
+        ("resync", "", None),
+        ("start", NEW_ID, "srv-1"),
+        ("die", OTHER_ID, "srv-2"),
+        ("start", UNKNOWN_ID, "not-a-server"),
+        ("resync", "", None),
+        ("destroy", NEW_ID, "srv-1"),
+    ]
+    assert watcher.connected
+    query = urllib.parse.parse_qs(urllib.parse.urlsplit(engine.paths[0]).query)
+    assert json.loads(query["filters"][0]) == {"type": ["container"], "event": ["start", "die", "destroy"]}
+
+    srv1 = main.DiscoveredServer(server_id="srv-1", container_id=OLD_ID, allocated_port=25565)
+    srv2 = main.DiscoveredServer(server_id="srv-2", container_id=OTHER_ID, allocated_port=25566)
+    known = {"srv-1": srv1, "srv-2": srv2}
+    running = [srv1, srv2]
+
+    # The first connect always asks for a full reconciliation.
+    running, reconcile = main.apply_container_events(events[:1], running, known)
+    assert reconcile
+    assert running == [srv1, srv2]
+
+    # Wings recreates the container on start; the server keeps its slot under
+    # the new container id.
+    running, reconcile = main.apply_container_events(events[1:2], running, known)
+    assert not reconcile
+    assert running == [main.DiscoveredServer(server_id="srv-1", container_id=NEW_ID, allocated_port=25565), srv2]
+    assert known["srv-1"].container_id == NEW_ID
+
+    running, reconcile = main.apply_container_events(events[2:3], running, known)
+    assert not reconcile
+    assert [server.server_id for server in running] == ["srv-1"]
+
+    running, reconcile = main.apply_container_events(events[3:4], running, known)
+    assert reconcile
+    assert [server.server_id for server in running] == ["srv-1"]
+
+    # A reconnect may have missed events, so it reconciles again.
+    running, reconcile = main.apply_container_events(events[4:5], running, known)
+    assert reconcile
+
+    running, reconcile = main.apply_container_events(events[5:], running, known)
+    assert not reconcile
+    assert running == []
+
+
+def test_every_reconnect_queues_a_resync(watch):
+    engine, watcher = watch([[], [], []])
+
+    events = drain_until(watcher, 3)
+
+    assert [event.action for event in events] == ["resync", "resync", "resync"]
+    assert len(engine.paths) == 3
+
+
+def test_stop_interrupts_an_idle_stream(watch):
+    _, watcher = watch([[]])
+    assert [event.action for event in drain_until(watcher, 1)] == ["resync"]
+
+    started = time.monotonic()
+    watcher.stop()
+    watcher._thread.join(timeout=2.0)
+
+    assert not watcher._thread.is_alive()
+    assert time.monotonic() - started < 2.0
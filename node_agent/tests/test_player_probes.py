@@ -0,0 +1,84 @@
+import os
+import socket
+
+import pytest
+
+import main
+
+
+@pytest.fixture
+def listener():
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.bind(("127.0.0.1", 0))
+    server.listen()
+    yield server
+    server.close()
+
+
+def write_procs(tmp_path, *pids: int) -> str:
+    (tmp_path / "cgroup.procs").write_text("".join(f"{pid}\n" for pid in pids))
+    return str(tmp_path)
+
+
+def connect(listener: socket.socket, count: int) -> list[socket.socket]:
+    sockets = []
+    for _ in range(count):
+        client = socket.create_connection(listener.getsockname())
+        accepted, _ = listener.accept()
+        sockets.extend([client, accepted])
+    return sockets
+
+
+def test_counts_established_connections_in_the_container_namespace(tmp_path, listener):
+    # This process stands in for the container's first process.
+    cgroup_path = write_procs(tmp_path, 0, os.getpid())
+    port = listener.getsockname()[1]
+    counter = main.PassiveConnectionCounter(main.PseudoFileReader())
+
+    assert counter.players_online(cgroup_path, port) == 0
+
+    sockets = connect(listener, 3)
+    try:
+        assert counter.players_online(cgroup_path, port) == 3
+    finally:
+        for sock in sockets:
+            sock.close()
+
+
+def test_reads_tables_longer_than_one_page(tmp_path, listener):
+    # 40 clients are 80 rows of about 150 bytes, well past a 4 KiB page.
+    cgroup_path = write_procs(tmp_path, os.getpid())
+    port = listener.getsockname()[1]
+    counter = main.PassiveConnectionCounter(main.PseudoFileReader(buffer_bytes=4096))
+
+    sockets = connect(listener, 40)
+    try:
+        assert counter.players_online(cgroup_path, port) == 40
+    finally:
+        for sock in sockets:
+            sock.close()
+
+
+def test_no_listener_or_no_visible_process_is_unknown(tmp_path, listener):
+    port = listener.getsockname()[1]
+    counter = main.PassiveConnectionCounter(main.PseudoFileReader())
+
+    listener.close()
+    assert counter.players_online(write_procs(tmp_path, os.getpid()), port) is None
+    assert counter.players_online(write_procs(tmp_path, 0), port) is None
+    assert counter.players_online(str(tmp_path / "gone"), port) is None
+
+
+def test_engine_answers_passively_with_a_cgroup_path(tmp_path, listener, agent_config):
+    engine = main.PlayerProbeEngine(agent_config(AGENT_PLAYER_PROBES="passive"), reader=main.PseudoFileReader())
+    port = listener.getsockname()[1]
+    states = {"srv-1": main.ServerRuntimeState()}
+    sockets = connect(listener, 2)
+    try:
+        assert engine.submit("srv-1", "127.0.0.1", port, 0.0, cgroup_path=write_procs(tmp_path, os.getpid()))
+        engine.harvest(states, 0.0)
+        assert states["srv-1"].players_online == 2
+    finally:
+        for sock in sockets:
+            sock.close()
+        engine.close()
@@ -0,0 +1,206 @@
+import gzip
+import http.server
+import json
+import threading
+from typing import Any, Optional
+
+import pytest
+
+import main
+
+
+class StandInOrchestrator:
+    # Records every POST with its decoded body; responds with `status`.
+    def __init__(self) -> None:
+        self.requests: list[dict[str, Any]] = []
+        self.status = 200
+        self.server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _handler(self) -> type:
+        orchestrator = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_POST(self) -> None:  # noqa: N802
+                raw = self.rfile.read(int(self.headers.get("Content-Length", "0")))
+                encoding = self.headers.get("Content-Encoding")
+                orchestrator.requests.append(
+                    {
+                        "path": self.path,
+                        "encoding": encoding,
+                        "authorization": self.headers.get("Authorization"),
+                        "body": json.loads(decode_body(raw, encoding)),
+                    }
+                )
+                body = b"{}"
+                self.send_response(orchestrator.status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format: str, *args: Any) -> None:  # noqa: A002
+                pass
+
+        return Handler
+
+
+def decode_body(raw: bytes, encoding: Optional[str]) -> bytes:
+    if encoding == "gzip":
+        return gzip.decompress(raw)
+    if encoding == "zstd":
+        zstandard = pytest.importorskip("zstandard")
+        return zstandard.ZstdDecompressor().decompress(raw)
+    assert encoding is None
+    return raw
+
+
+@pytest.fixture
+def orchestrator():
+    server = StandInOrchestrator()
+    server.start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def make_publisher(orchestrator, agent_config):
+    clients: list[main.HttpClient] = []
+
+    def factory(**env: str) -> main.OrchestratorPublisher:
+        config = agent_config(NODE_ID="node/1", ORCHESTRATOR_BASE_URL=orchestrator.base_url, **env)
+        client = main.HttpClient(timeout_sec=config.http_timeout_sec, insecure_tls=False)
+        clients.append(client)
+        return main.OrchestratorPublisher(config, client)
+
+    yield factory
+    for client in clients:
+        client.close()
+
+
+def make_samples(count: int) -> list[dict[str, Any]]:
+    return [
+        {
+            "node_id": "node/1",
+            "timestamp": f"2026-01-01T00:00:{index:02d}Z",
+            "servers": [{"server_id": "s1", "cpu_pct": float(index)}],
+        }
+        for index in range(count)
+    ]
+
+
+def test_batch_hoists_node_id_and_keeps_sample_timestamps(orchestrator, make_publisher):
+    publisher = make_publisher(AGENT_UPLOAD_BATCH_SIZE="3", AGENT_UPLOAD_COMPRESSION="gzip")
+
+    result = publisher.publish_batch(make_samples(3))
+
+    assert result.sent
+    [request] = orchestrator.requests
+    assert request["path"] == "/internal/nodes/node%2F1/telemetry/batch"
+    assert request["encoding"] == "gzip"
+    assert request["authorization"] == "Bearer secret"
+    body = request["body"]
+    assert body["node_id"] == "node/1"
+    assert all("node_id" not in sample for sample in body["samples"])
+    assert [sample["timestamp"] for sample in body["samples"]] == [
+        "2026-01-01T00:00:00Z",
+        "2026-01-01T00:00:01Z",
+        "2026-01-01T00:00:02Z",
+    ]
+    assert publisher.wire_bytes < publisher.payload_bytes
+
+
+def test_batch_zstd_when_available(orchestrator, make_publisher):
+    pytest.importorskip("zstandard")
+    publisher = make_publisher(AGENT_UPLOAD_BATCH_SIZE="2", AGENT_UPLOAD_COMPRESSION="zstd")
+
+    assert publisher.publish_batch(make_samples(2)).sent
+
+    [request] = orchestrator.requests
+    assert request["encoding"] == "zstd"
+    assert [sample["timestamp"] for sample in request["body"]["samples"]] == [
+        "2026-01-01T00:00:00Z",
+        "2026-01-01T00:00:01Z",
+    ]
+
+
+def test_batch_falls_back_to_gzip_without_zstandard(orchestrator, make_publisher, monkeypatch):
+    monkeypatch.setattr(main, "zstandard", None)
+    publisher = make_publisher(AGENT_UPLOAD_BATCH_SIZE="2", AGENT_UPLOAD_COMPRESSION="zstd")
+
+    assert publisher.publish_batch(make_samples(2)).sent
+
+    assert orchestrator.requests[0]["encoding"] == "gzip"
+
+
+def test_batch_uncompressed(orchestrator, make_publisher):
+    publisher = make_publisher(AGENT_UPLOAD_BATCH_SIZE="2", AGENT_UPLOAD_COMPRESSION="none")
+
+    assert publisher.publish_batch(make_samples(2)).sent
+
+    [request] = orchestrator.requests
+    assert request["encoding"] is None
+    assert request["body"]["node_id"] == "node/1"
+
+
+def test_single_publish_keeps_legacy_shape(orchestrator, make_publisher):
+    publisher = make_publisher()
+
+    assert publisher.publish_samples(make_samples(2)).sent
+
+    assert [request["path"] for request in orchestrator.requests] == [
+        "/internal/nodes/node%2F1/telemetry",
+        "/internal/nodes/node%2F1/telemetry",
+    ]
+    assert all(request["encoding"] is None for request in orchestrator.requests)
+    assert [request["body"] for request in orchestrator.requests] == make_samples(2)
+
+
+@pytest.mark.parametrize("batch_size", [1, 2])
+def test_spool_replay_through_publish_samples(orchestrator, make_publisher, tmp_path, batch_size):
+    publisher = make_publisher(AGENT_UPLOAD_BATCH_SIZE=str(batch_size))
+    spool = main.TelemetrySpool(str(tmp_path), max_bytes=1024 * 1024, segment_bytes=4096, fsync_interval_sec=0.0)
+    samples = make_samples(5)
+    for sample in samples:
+        spool.append(sample)
+
+    replayed = spool.drain(publisher.publish_samples, max_items=10, chunk_size=batch_size)
+
+    assert replayed == 5
+    assert not spool.has_pending()
+    if batch_size == 1:
+        delivered = [request["body"] for request in orchestrator.requests]
+        assert delivered == samples
+    else:
+        assert [len(request["body"]["samples"]) for request in orchestrator.requests] == [2, 2, 1]
+        delivered = [sample for request in orchestrator.requests for sample in request["body"]["samples"]]
+        assert [sample["timestamp"] for sample in delivered] == [sample["timestamp"] for sample in samples]
+    spool.close()
+
+
+def test_spool_replay_keeps_samples_on_retryable_failure(orchestrator, make_publisher, tmp_path):
+    orchestrator.status = 503
+    publisher = make_publisher(AGENT_UPLOAD_BATCH_SIZE="2")
+    spool = main.TelemetrySpool(str(tmp_path), max_bytes=1024 * 1024, segment_bytes=4096, fsync_interval_sec=0.0)
+    for sample in make_samples(3):
+        spool.append(sample)
+
+    assert spool.drain(publisher.publish_samples, max_items=10, chunk_size=2) == 0
+    assert spool.has_pending()
+
+    orchestrator.status = 200
+    assert spool.drain(publisher.publish_samples, max_items=10, chunk_size=2) == 3
+    assert not spool.has_pending()
+    spool.close()
@@ -0,0 +1,104 @@
+import http.server
+import json
+import threading
+from typing import Any
+
+import pytest
+
+import main
+
+
+class FakeWings:
+    # Serves canned (content type, body) pairs by path; everything else 404s.
+    def __init__(self, routes: dict[str, tuple[str, bytes]]) -> None:
+        self.routes = routes
+        self.paths: list[str] = []
+        self.server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _handler(self) -> type:
+        wings = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self) -> None:  # noqa: N802
+                wings.paths.append(self.path)
+                content_type, body = wings.routes.get(self.path, ("text/plain", b""))
+                self.send_response(200 if self.path in wings.routes else 404)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format: str, *args: Any) -> None:  # noqa: A002
+                pass
+
+        return Handler
+
+
+SERVERS_JSON = json.dumps(
+    {"data": [{"uuid": "srv-1", "container_id": "abc123", "allocation": {"port": 25565}, "state": "running"}]}
+).encode("utf-8")
+PANEL_HTML = b"<!doctype html><html><body>Login</body></html>"
+
+
+@pytest.fixture
+def make_discoverer(agent_config):
+    servers: list[FakeWings] = []
+    clients: list[main.HttpClient] = []
+
+    def factory(routes: dict[str, tuple[str, bytes]]) -> tuple[main.WingsDiscoverer, FakeWings]:
+        wings = FakeWings(routes)
+        wings.start()
+        servers.append(wings)
+        config = agent_config(WINGS_BASE_URL=wings.base_url)
+        client = main.HttpClient(timeout_sec=config.http_timeout_sec, insecure_tls=False)
+        clients.append(client)
+        return main.WingsDiscoverer(config, client), wings
+
+    yield factory
+    for client in clients:
+        client.close()
+    for wings in servers:
+        wings.stop()
+
+
+def test_non_json_endpoint_falls_through_to_next_candidate(make_discoverer):
+    discoverer, wings = make_discoverer(
+        {
+            "/api/servers": ("text/html", PANEL_HTML),
+            "/api/system/servers": ("application/json", SERVERS_JSON),
+        }
+    )
+
+    assert discoverer.discover_servers() == [
+        main.DiscoveredServer(server_id="srv-1", container_id="abc123", allocated_port=25565)
+    ]
+    assert wings.paths == ["/api/servers", "/api/system/servers"]
+
+    # The endpoint that parsed stays sticky; the HTML one is not retried.
+    wings.paths.clear()
+    assert [server.server_id for server in discoverer.discover_servers()] == ["srv-1"]
+    assert wings.paths == ["/api/system/servers"]
+
+
+def test_no_json_endpoint_discovers_nothing(make_discoverer):
+    discoverer, wings = make_discoverer(
+        {endpoint: ("text/html", PANEL_HTML) for endpoint in main.WingsDiscoverer.CANDIDATE_ENDPOINTS}
+    )
+
+    assert discoverer.discover_servers() == []
+    assert wings.paths == list(main.WingsDiscoverer.CANDIDATE_ENDPOINTS)
+    assert discoverer._endpoint is None
+    assert discoverer._body_digest is None